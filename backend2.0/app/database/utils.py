@@ -9,6 +9,9 @@ import json
 from database.models.core import Template
 from database.models.data_sources import DataSource
 
+# The rows of a GetConnector the length of a source gets counted over at most, counting doesn't need all of them.
+LENGTH_MAX_ROWS = 10000
+
 
 async def check_profit_connection(endpoint: str, environment_token: str):
     """**Checks the connection with profit.**
@@ -98,21 +101,15 @@ async def get_source_length(
     length_source = {}
     if data_source.source.type_source == "GetConnector":
         source_name = data_source.source.get_connector.name
-        source_data = await connections.get_connector_data(
-            template.profit_endpoint, template.token, source_name, {"skip": 0, "take": 10000}
+        source_rows = await connections.get_connector_rows(
+            template.profit_endpoint, template.token, source_name, max_rows=LENGTH_MAX_ROWS
         )
-        try:
-            source_rows = source_data["rows"]
-        except KeyError:
-            raise ProfitError(error_code=ErrorCode.P0013, msg_args=(source_name,))
         if filter_source := data_source.filter_source:
             if filter_source.source.type_source == "GetConnector":
                 filter_source_name = filter_source.source.get_connector.name
-                filter_source_data = await connections.get_connector_data(
-                    template.profit_endpoint, template.token, filter_source_name,
-                    {"skip": 0, "take": 10000}
+                filter_source_rows = await connections.get_connector_rows(
+                    template.profit_endpoint, template.token, filter_source_name, max_rows=LENGTH_MAX_ROWS
                 )
-                filter_source_rows = filter_source_data["rows"]
                 source_filter_field, filter_source_filter_field = await get_filter_field_ids(
                     template.profit_endpoint,
                     template.token,
@@ -149,11 +146,9 @@ async def get_source_length(
             filter_field = filter_source.filter_field
             if filter_source.source.type_source == "GetConnector":
                 filter_source_name = filter_source.source.get_connector.name
-                filter_source_data = await connections.get_connector_data(
-                    template.profit_endpoint, template.token, filter_source_name,
-                    {"skip": 0, "take": 10000}
+                filter_source_rows = await connections.get_connector_rows(
+                    template.profit_endpoint, template.token, filter_source_name, max_rows=LENGTH_MAX_ROWS
                 )
-                filter_source_rows = filter_source_data["rows"]
                 source_values = set(row[filter_field] for row in source_rows)
                 filter_values = set(row[filter_field] for row in filter_source_rows)
                 pass
@@ -0,0 +1,80 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+from errors import GeneratorError, ErrorCode
+
+DATE_FORMAT = "%Y-%m-%d"
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+CSV_DATE_FORMAT = "%m/%d/%y"
+# The number of raw strings per parser whose result is kept, dates of sources repeat on many rows.
+DATE_CACHE_SIZE = 65536
+# The Profit data types of the fields that never hold a date.
+NON_DATE_DATA_TYPES = ("string", "int", "decimal", "boolean", "blob")
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse_date(value: str) -> Optional[datetime]:
+    for date_format in (DATE_FORMAT, DATETIME_FORMAT):
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            pass
+    return None
+
+
+def parse_date(value: str) -> datetime:
+    """Parses a date parameter of a function, in the date or the datetime format."""
+    date = _parse_date(value)
+    if date is None:
+        raise GeneratorError(ErrorCode.U0009, (DATE_FORMAT, DATETIME_FORMAT))
+    return date
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _csv_date(value: str) -> str:
+    try:
+        return datetime.strptime(value, CSV_DATE_FORMAT).strftime(DATE_FORMAT)
+    except ValueError:
+        return value
+
+
+def csv_date(value: Any) -> Any:
+    """Re-formats a date from a csv source (`%m/%d/%y`) to the date format, other values are returned as they are."""
+    if isinstance(value, str) and "/" in value:
+        return _csv_date(value)
+    return value
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _profit_timestamp(value: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value[:-1])
+    except ValueError:
+        return None
+
+
+def profit_date(value: Any) -> Any:
+    """**Converts a UTC timestamp (`...Z`) to the local date Profit expects, other values are returned as they are.**
+
+    Only the parsing is cached, the conversion to the local timezone happens on every call.
+    """
+    if isinstance(value, str):
+        timestamp = _profit_timestamp(value)
+        return value if timestamp is None else timestamp.astimezone().strftime(DATE_FORMAT)
+    return value
+
+
+def _unchanged(value: Any) -> Any:
+    return value
+
+
+def date_normaliser(data_type: Optional[str], parser: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """**Picks how the values of a field get normalised, from the Profit data type of the field.**
+
+    Date fields always get the parser and fields of another known type never do. Only a field without a (known) data
+    type tries the parser on every value, like before the data types were used.
+    """
+    if data_type in NON_DATE_DATA_TYPES:
+        return _unchanged
+    return parser
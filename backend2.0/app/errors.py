@@ -1,4 +1,5 @@
 from enum import Enum
+from functools import partial
 from typing import Any, Optional
 
 from fastapi import HTTPException
@@ -89,6 +90,10 @@ class ErrorCode(Enum):
             "rijen die mogelijk zijn om te genereren, maar u heeft %s opgegeven. Verlaag het aantal rijen om goed te " \
             "genereren."
     U0031 = "U wilt veld %s gebruiken in veld %s. Dit kan natuurlijk niet. Gebruik een ander veld."
+    U0032 = "Veld %s moet uniek zijn, maar de functie kan maar %s verschillende waardes genereren en er zijn %s " \
+            "rijen nodig. Verlaag het aantal rijen of vergroot het bereik van de functie."
+    U0033 = "Veld %s moet uniek zijn, maar na %s pogingen is er geen nieuwe waarde gegenereerd. Verlaag het aantal " \
+            "rijen of vergroot het bereik van de functie."
 
     P0000 = "Onbekende profit error opgetreden"
     P0001 = "Kan geen connectie maken naar profit met de gegeven endpoint en token"
@@ -108,6 +113,8 @@ class ErrorCode(Enum):
     P0012 = "Server geeft een timeout. Verlaag het aantal requests of neem contact op met de developers."
     P0013 = "In dit process staat Getconnector %s en die staat niet in de App Connector in profit. Voeg deze eerst " \
             "toe voordat u iets kunt doen."
+    P0014 = "Profit omgeving %s gaf te vaak achter elkaar een fout, er worden %s seconden geen requests meer naar " \
+            "gestuurd. Check https://afasstatus.nl/ voor meer informatie."
 
     Z0000 = "Onbekende error opgetreden"
 
@@ -131,6 +138,10 @@ class RocketError(Exception):
     def __str__(self) -> str:
         return f"({self.error_code.name}) {self.error_msg}"
 
+    def __reduce__(self):
+        """Pickles the error with its keyword arguments, an error of a shard process gets sent to the run."""
+        return partial(type(self), **self.kwargs), (self.error_code, self.msg_args, self.status_code)
+
 
 class ProfitError(RocketError):
     pass
@@ -0,0 +1,86 @@
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import List, Union
+
+import numpy
+
+# The years the holiday calendar is precomputed for, dates outside of them have no holidays.
+HOLIDAY_YEARS = range(1900, 2200)
+# The year Koninginnedag (30 April) became Koningsdag (27 April).
+KINGS_DAY_YEAR = 2014
+
+Dates = Union[date, numpy.datetime64, numpy.ndarray]
+Days = Union[int, numpy.ndarray]
+
+
+def easter_sunday(year: int) -> date:
+    """Easter Sunday of the Gregorian calendar (the anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    j = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * j) // 451
+    month, day = divmod(h + j - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def dutch_holidays(year: int) -> List[date]:
+    """The Dutch public holidays of a year, Bevrijdingsdag only in the lustrum years it is a day off."""
+    easter = easter_sunday(year)
+    if year >= KINGS_DAY_YEAR:
+        kings_day = date(year, 4, 27)
+        sunday_shift = -1  # Koningsdag moves to the Saturday before.
+    else:
+        kings_day = date(year, 4, 30)
+        sunday_shift = 1  # Koninginnedag moved to the Monday after.
+    if kings_day.isoweekday() == 7:
+        kings_day += timedelta(days=sunday_shift)
+    holidays = [
+        date(year, 1, 1),
+        easter,
+        easter + timedelta(days=1),
+        kings_day,
+        easter + timedelta(days=39),  # Hemelvaartsdag
+        easter + timedelta(days=49),  # Pinksteren
+        easter + timedelta(days=50),
+        date(year, 12, 25),
+        date(year, 12, 26),
+    ]
+    if year % 5 == 0:
+        holidays.append(date(year, 5, 5))
+    return sorted(holidays)
+
+
+@lru_cache(maxsize=None)
+def business_calendar(weekends: bool = False, holidays: bool = True) -> numpy.busdaycalendar:
+    """**The calendar of the days that count, built once per combination.**
+
+    `weekends` and `holidays` tell whether those days count, like the `weekend_dagen_meenemen` and
+    `feestdagen_meenemen` parameters. The holidays are a precomputed bitmap over `HOLIDAY_YEARS`, which NumPy searches
+    instead of walking the days.
+    """
+    weekmask = "1111111" if weekends else "1111100"
+    if holidays:
+        return numpy.busdaycalendar(weekmask=weekmask)
+    return numpy.busdaycalendar(
+        weekmask=weekmask,
+        holidays=[holiday for year in HOLIDAY_YEARS for holiday in dutch_holidays(year)],
+    )
+
+
+def count_days(begin: Dates, end: Dates, weekends: bool = False, holidays: bool = True) -> Days:
+    """The number of days in `[begin, end)` that count, in constant time. Works on arrays of dates as well."""
+    return numpy.busday_count(begin, end, busdaycal=business_calendar(weekends, holidays))
+
+
+def offset_days(begin: Dates, offsets: Days, weekends: bool = False, holidays: bool = True) -> numpy.ndarray:
+    """The dates `offsets` counting days after `begin`, where a `begin` that doesn't count moves to the next one."""
+    return numpy.busday_offset(begin, offsets, roll="forward", busdaycal=business_calendar(weekends, holidays))
+
+
+def to_date(value: numpy.datetime64) -> date:
+    return value.astype(date)
@@ -1,35 +1,96 @@
 from __future__ import annotations
 
-import random
 import math
-from typing import Optional
+import multiprocessing
+import os
+import pickle
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from errors import GeneratorError, ErrorCode
 from generator.schemas import input
-from generator.functions.function_tree import CompositeFunction, LeafFunction
+from generator.functions.function_tree import FieldPlan, RowContext, optimise_field_plans
+from generator.hierarchy import ConnectorTree
+from generator.planner import FieldOrder, plan_field_order
 from generator.profit import Fuel
+from generator.rng import RandomStreams
 from generator.schemas.functions import FunctionsMetaInfo
-from generator.utils import attr_find_get, attr_find, parameter_get, find_values, remove_empty_rows,\
-    parameter_get_solo, find_field_name
+from generator.sources import SourceCursors, SourceIndex
+from generator.unique import UniqueValues
+from generator.utils import attr_find_get, parameter_get, find_values
 from generator.variables import Variables
 
+# A field that gets this value removes its row, together with the rows of its sub-connectors.
+DELETE = "##DELETE"
+# From this amount of rows on, fields with constant parameters get generated per column instead of per row.
+COLUMN_THRESHOLD = 64
+# From this amount of root rows on, the root rows get generated in shards by a pool of processes.
+SHARD_THRESHOLD = 20000
+SHARD_WORKERS = os.cpu_count() or 1
+# The processes of the pool start from a fresh interpreter instead of a fork of this process, whose other threads (the
+# event loop, the Profit session, logging) may hold locks that a forked process would never see released.
+SHARD_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# The pool of the sharded runs, created once and shared by the runs of this process: their shards queue up in it.
+_shard_pool: Optional[ProcessPoolExecutor] = None
+_shard_pool_lock = threading.Lock()
+
+
+def shard_pool() -> ProcessPoolExecutor:
+    """Returns the shard pool, started on the first sharded run; the forkserver imports the generator only once."""
+    global _shard_pool
+    with _shard_pool_lock:
+        if _shard_pool is None:
+            context = multiprocessing.get_context(SHARD_START_METHOD)
+            if SHARD_START_METHOD == "forkserver":
+                context.set_forkserver_preload(["generator.core"])
+            _shard_pool = ProcessPoolExecutor(SHARD_WORKERS, mp_context=context)
+        return _shard_pool
+
+
+def shutdown_shard_pool(pool: Optional[ProcessPoolExecutor] = None):
+    """Shuts the shard pool down, or only drops it when it is not the given (broken) pool anymore."""
+    global _shard_pool
+    with _shard_pool_lock:
+        if pool is not None and pool is not _shard_pool:
+            return
+        pool, _shard_pool = _shard_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+
+def _generate_shard(root_connector: bytes, start: int, stop: int, rows_before: Dict[str, int]) -> Tuple[list, bool]:
+    connector: Connector = pickle.loads(root_connector)
+    connector.seek(rows_before)
+    connector.generate(range(start, stop))
+    return connector.generated_data["Element"], connector.row_removed
+
 
 class Engine:
     def __init__(self, fuel: Fuel):
         self._configurations = fuel.configurations
+        self._connector_tree = fuel.connector_tree
         self._metainfo = fuel.metainfo
         self._raw_source_data = fuel.source_data
         self._source_metainfo = fuel.source_metainfo  # TODO: raw separation
         self._variables = fuel.variables
         self._functions_metainfo = fuel.functions_metainfo
         self._row_counter = 0
+        self.random_streams = RandomStreams(self._configurations.seed)
         self._source_data = {}
-        self._full_source_data = []
+        self._source_repeatable = {}
+        self._source_index = SourceIndex(self._source_data, self.random_streams)
+        self._source_cursors = SourceCursors(self._source_data, self._source_repeatable, self.random_streams)
+        self._field_order: FieldOrder = {}
+        self._field_plans: Dict[str, List[FieldPlan]] = {}
+        self._shardable = True
         self.generated_data = []
+        self.row_removed = False
 
     def apply_source_filtering(self):
         for data_source in self._configurations.data_sources:
-            data = {}
             if data_source.source.type_source == "GetConnector":
                 source_name = data_source.source.name
                 raw_source_data = self._raw_source_data[source_name]
@@ -54,7 +115,6 @@ class Engine:
                             set(row[filter_source_field_id] for row in self._raw_source_data[filter_source_name])
                         source_data = [row for row in raw_source_data if row[source_field_id] not in filter_values]
                         source_name += f" - {filter_source_name}"
-                        data['repeatable'] = data_source.repeatable
                     else:
                         source_filter_field = filter_source.filter_field
                         filter_source_name = filter_source.source.csv_file.file_name
@@ -65,10 +125,8 @@ class Engine:
                             self._raw_source_data
                         )
                         source_name += f" - {filter_source_name}"
-                        data["repeatable"] = data_source.repeatable
                 else:
                     source_data = list(raw_source_data)
-                    data['repeatable'] = data_source.repeatable
             else:
                 source_name = data_source.source.csv_file.file_name
                 raw_source_data = self._raw_source_data[source_name]
@@ -80,7 +138,6 @@ class Engine:
                             set(row[source_filter_field] for row in self._raw_source_data[filter_source_name])
                         source_data = [row for row in raw_source_data if row[source_filter_field] not in filter_values]
                         source_name += f" - {filter_source_name}"
-                        data["repeatable"] = data_source.repeatable
                     else:
                         filter_source_name = filter_source.source.csv_file.file_name
                         source_data = find_values(
@@ -90,156 +147,150 @@ class Engine:
                             self._raw_source_data
                         )
                         source_name += f" - {filter_source_name}"
-                        data["repeatable"] = data_source.repeatable
                 else:
                     source_data = list(raw_source_data)
-                    data["repeatable"] = data_source.repeatable
 
             for filter_row in data_source.field_filter_rows:
                 pass  # TODO
 
             data_source.name = source_name
-            data[source_name] = source_data
             self._source_data[source_name] = source_data
-            self._full_source_data.append(data)
+            self._source_repeatable[source_name] = data_source.repeatable
 
-    def topological_sort_fields(self):
-        """**Sorts fields in topological order.**
+    def plan_fields(self):
+        """Orders the fields of every connector after the fields they depend on, see `plan_field_order`."""
+        self._field_order = plan_field_order(self._connector_tree, self._configurations.connectors)
 
-        Fields that use the 'veld_waarde' function are dependent on another fields generated output.
-        This function check for those dependencies between fields and orders them in the correct order.
+    @staticmethod
+    def find_active_get_connectors(connector: input.Connector) -> List[str]:
+        get_connector_list = []
+        for field in connector.fields_:
+            for function in field.functions:
+                if function.metainfo.name == "bron_waarde" or function.metainfo.name == "bron_waarde_met_vaste_waarde":
+                    get_connector = next(item for item in function.parameters if item.name == "get_connector")
+                    get_connector_list.append(get_connector.input)
+        return get_connector_list
+
+    def compile_field_plans(self):
+        """**Compiles the function tree of every field once per run.**
 
-        First a dependency graph gets created in the form of a dict, for example:
-            {"a": ["b"]}
+        Has to run after the fields are planned, because the plans of a connector are kept in the generation order. The
+        identical subtrees of the fields of a connector get shared, see `optimise_field_plans`. Fields with unique values
+        get their `UniqueValues`, a run with a unique field that can't list its values isn't sharded.
         """
         for connector in self._configurations.connectors:
-            graph = {}
-            connector_fields = {field.field_code for field in connector.fields_}
-            for field in connector.fields_:
-                dependencies = []
-                for function in field.functions:
-                    if function.metainfo.name == "veld_waarde":
-                        dependency = parameter_get_solo(function.parameters, "field_id", GeneratorError(ErrorCode.B0000))
-                        if dependency in connector_fields:
-                            dependencies.append(dependency)
-                graph[field.field_code] = dependencies
-
-            unsorted_fields = set(graph)
-            sorted_fields = []
-            while True:
-                ordered = [field for field, dependencies in graph.items() if not dependencies]
-                sorted_fields.extend(ordered)
-                if not ordered:
-                    break
-                graph = {field: [dependency for dependency in dependencies if dependency not in ordered]
-                         for field, dependencies in graph.items() if field not in ordered}
+            self._source_cursors.register(connector.hierarchy, self.find_active_get_connectors(connector))
+            field_order = self._field_order[connector.hierarchy]
+            positions = {field_code: position for position, field_code in enumerate(field_order)}
+            self._field_plans[connector.hierarchy] = [
+                FieldPlan(
+                    field=field,
+                    source_data=self._source_data,
+                    source_metainfo=self._source_metainfo,
+                    source_index=self._source_index,
+                    functions_metainfo=self._functions_metainfo,
+                    variables=self._variables,
+                )
+                for field in sorted(connector.fields_, key=lambda field: positions[field.field_code])
+            ]
+            optimise_field_plans(self._field_plans[connector.hierarchy])
+            for field_plan in self._field_plans[connector.hierarchy]:
+                if field_plan.field.unique:
+                    field_plan.unique = UniqueValues(
+                        field_plan.field.metainfo.label if field_plan.field.metainfo else field_plan.field_code,
+                        field_plan.function.unique_domain(),
+                        self.random_streams.stream("unique", connector.hierarchy, field_plan.field_code),
+                    )
+                    self._shardable = self._shardable and field_plan.unique.shardable
 
-            failed_fields = unsorted_fields - set(sorted_fields)
-            if failed_fields:
-                fieldnames = [find_field_name(connector.metainfo.fields_, field) for field in failed_fields]
-                raise GeneratorError(ErrorCode.U0008, (', '.join(fieldnames),))
-            connector.fields_.sort(key=lambda sorted_field: sorted_fields.index(sorted_field.field_code))
+    def stream(self) -> Iterator[dict]:
+        """**Yields the finished root elements one at a time, has to run after `prepare`.**
 
-    def toposort(self):
-        connector_fields = {}
-        for connector in self._configurations.connectors:
-            graph = {}
-            connector_fields[connector.name] = {field.field_code for field in connector.fields_}
-            for field in connector.fields_:
-                dependecies = []
-                for function in field.functions:
-                    if function.metainfo.name == "veld_waarde":
-                        dependecy = parameter_get(function.parameters, "field_id", GeneratorError(ErrorCode.B0000))
-                        aap = dependecy.split(";")
-                        try:
-                            try:
-                                dat = aap[0].split("->")
-                                losCon = dat[1].strip()
-                                if aap[1] in connector_fields[losCon]:
-                                    newDep = losCon + ";" + aap[1]
-                                    dependecies.append(newDep)
-                            except IndexError:
-                                if aap[1] in connector_fields[aap[0]]:
-                                    dependecies.append(dependecy)
-                        except KeyError:
-                            raise GeneratorError(
-                                error_code=ErrorCode.U0021,
-                                msg_args=(aap[0], find_field_name(connector.metainfo.fields_, aap[1]))
-                            )
-                graph[connector.name + ";" + field.field_code] = dependecies
-            unsorted_fields = set(graph)
-            sorted_fields = []
-            while True:
-                orderd = []
-                for field, dependencies in graph.items():
-                    if field not in dependencies:
-                        orderd.append(field)
-                sorted_fields.extend(orderd)
-                if len(orderd) == 0:
-                    break
-                graph = {field: [dependency for dependency in dependencies if dependency not in orderd]
-                         for field, dependencies in graph.items() if field not in orderd}
-
-            failed_field = unsorted_fields - set(sorted_fields)
-            if failed_field:
-                oef = []
-                for field in failed_field:
-                    ip = field.split(";")
-                    oef.append(ip[1])
-                fieldnames = [find_field_name(connector.metainfo.fields_, field) for field in oef]
-                raise GeneratorError(ErrorCode.U0008, (list(fieldnames),))
-            fields = []
-            for field in sorted_fields:
-                new = field.split(";")
-                fields.append(new[1])
-            connector.fields_.sort(key=lambda sorted_field: fields.index(sorted_field.field_code))
-
-    def generate(self):
-        root_connector_config = attr_find(
-            iterable=self._configurations.connectors,
-            find_attr="hierarchy",
-            find_value=self._metainfo.name,
-            error=GeneratorError(ErrorCode.B0005)
-        )
+        Only the root element that is being generated is kept in memory, instead of all of them. Rows with `##DELETE`
+        are left out while generating, `row_removed` tells afterwards if any were.
+        """
+        self.row_removed = False
         root_connector = Connector(
-            configurations=self._configurations,
-            connector_config=root_connector_config,
+            connector_tree=self._connector_tree,
+            connector_config=self._connector_tree.get(self._metainfo.name),
             source_data=self._source_data,
-            full_source_data=self._full_source_data,
+            source_cursors=self._source_cursors,
             source_metainfo=self._source_metainfo,
+            source_index=self._source_index,
             variables=self._variables,
-            functions_metainfo=self._functions_metainfo
+            functions_metainfo=self._functions_metainfo,
+            field_plans=self._field_plans,
+            random_streams=self.random_streams,
         )
-        root_connector.run()
-        for element in root_connector.generated_data["Element"]:  # TODO: maybe do this when sending to profit
-            self.generated_data.append({self._metainfo.name: {"Element": element}})
-
-    def remove_empty_rows(self):
-        new_data = {
-            "row_removed": False,
-            "generated_data": []
+        root_connector.calculate_rows_amount()
+        root_connector.prepare_sources()
+        root_connector.prepare_columns()
+        rows = range(root_connector.rows_amount)
+        shards = self.split_shards(root_connector.rows_amount) if self._shardable else [rows]
+        if len(shards) > 1:
+            elements = self.generate_sharded(root_connector, shards)
+        else:
+            elements = root_connector.iter_elements(rows)
+        for element in elements:  # TODO: maybe do this when sending to profit
+            yield {self._metainfo.name: {"Element": element}}
+        self.row_removed = self.row_removed or root_connector.row_removed
+
+    def generate(self):
+        generated_data = list(self.stream())
+        self.generated_data = {
+            "row_removed": self.row_removed,
+            "generated_data": generated_data,
         }
-        for item in self.generated_data:
-            new_item = remove_empty_rows(
-                {
-                    "row_removed": False,
-                    "item": item
-                }
-            )
-            if new_item["item"] is not None:
-                new_data["generated_data"].append(new_item["item"])
-            if new_item["row_removed"]:
-                new_data["row_removed"] = True
-        self.generated_data = new_data
 
-    def run(self):
+    @staticmethod
+    def split_shards(rows_amount: int) -> List[range]:
+        """Splits the root rows into one range per worker, or a single range if the run is too small to shard."""
+        if rows_amount < SHARD_THRESHOLD or SHARD_WORKERS < 2:
+            return [range(rows_amount)]
+        shard_size = math.ceil(rows_amount / SHARD_WORKERS)
+        return [range(start, min(start + shard_size, rows_amount)) for start in range(0, rows_amount, shard_size)]
+
+    def generate_sharded(self, root_connector: Connector, shards: List[range]) -> Iterator[dict]:
+        """**Generates the root rows in shards, each shard in a process of the shard pool.**
+
+        The root connector, with the compiled plans, the source data and its columns, gets pickled once and goes along
+        with every shard. Where the source cursors and the unique fields of the sub-connectors start for a shard gets
+        counted here, in one pass over the root rows (`Connector.count_rows`), while the shards before it are already
+        being generated. All randomness comes from the streams of the run, so the merged shards are the same as the
+        rows of a run that isn't sharded.
+        """
+        for source in root_connector.sources.values():
+            source.prepare(root_connector.rows_amount)
+        pool = shard_pool()
+        payload = pickle.dumps(root_connector, pickle.HIGHEST_PROTOCOL)
+        futures: List[Future] = []
+        rows_before: Dict[str, int] = {}
+        counted = 0
+        try:
+            for shard in shards:
+                for index in range(counted, shard.start):
+                    root_connector.count_rows(index, rows_before)
+                counted = shard.start
+                futures.append(pool.submit(_generate_shard, payload, shard.start, shard.stop, dict(rows_before)))
+            for future in futures:
+                elements, row_removed = future.result()
+                self.row_removed = self.row_removed or row_removed
+                yield from elements
+        except BrokenProcessPool:
+            shutdown_shard_pool(pool)  # The next run gets a new pool.
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def prepare(self):
         self.apply_source_filtering()
-        if len(self._configurations.connectors) == 1:
-            self.topological_sort_fields()
-        else:
-            self.toposort()
+        self.plan_fields()
+        self.compile_field_plans()
+
+    def run(self):
+        self.prepare()
         self.generate()
-        self.remove_empty_rows()
 
 
 class Connector:
@@ -247,33 +298,36 @@ class Connector:
 
     def __init__(
             self,
-            configurations: input.ConfigurationDashboard,
+            connector_tree: ConnectorTree,
             connector_config: input.Connector,
             source_data: dict,
-            full_source_data: list,
+            source_cursors: SourceCursors,
             source_metainfo: dict,
+            source_index: SourceIndex,
             variables: Variables,
             functions_metainfo: FunctionsMetaInfo,
-            parent_generated_fields: Optional[dict] = None
+            field_plans: Dict[str, List[FieldPlan]],
+            random_streams: RandomStreams,
+            parent_generated_fields: Optional[dict] = None,
+            row_path: Tuple[int, ...] = (),
     ):
-        self._configurations = configurations
+        self._connector_tree = connector_tree
         self._connector_config = connector_config
         self._metainfo = self._connector_config.metainfo
         self._source_data = source_data
-        self._full_source_data = full_source_data
+        self._source_cursors = source_cursors
         self._source_metainfo = source_metainfo
+        self._source_index = source_index
         self._variables = variables
         self._functions_metainfo = functions_metainfo
+        self._field_plans = field_plans
+        self._random_streams = random_streams
         self._parent_generated_fields = parent_generated_fields or {}
+        self._row_path = row_path  # The indices of the parent rows, the key of the random streams of this run.
         self.generated_data = {"Element": []}
-        self.get_connector_list = []
-
-    def find_active_get_connectors(self):
-        for field in self._connector_config.fields_:
-            for function in field.functions:
-                if function.metainfo.name == "bron_waarde" or function.metainfo.name == "bron_waarde_met_vaste_waarde":
-                    get_connector = next(item for item in function.parameters if item.name == "get_connector")
-                    self.get_connector_list.append(get_connector.input)
+        self.row_removed = False
+        self.sources = {}
+        self.columns = {}
 
     def calculate_rows_amount(self):
         rows_function = self._connector_config.connector_settings.rows_function
@@ -290,7 +344,8 @@ class Connector:
             if min_value > max_value:
                 raise GeneratorError(ErrorCode.U0015)
             try:
-                self.rows_amount = random.randint(min_value, max_value)
+                rng = self._random_streams.stream("rows_amount", self._connector_config.hierarchy, self._row_path)
+                self.rows_amount = rng.randint(min_value, max_value)
             except ValueError:
                 raise GeneratorError(ErrorCode.B0006)
         elif rows_function == "bron_percentage":
@@ -306,94 +361,129 @@ class Connector:
             self.rows_amount = int((source_length * (percentage / 100)) + 0.5)
 
     def prepare_sources(self):
-        if len(self.get_connector_list) != 0:
-            for data_source in self._full_source_data:
-                for item in data_source.keys():
-                    if item in self.get_connector_list:
-                        for source_name, rows in data_source.items():
-                            if source_name == "repeatable":
-                                repeatable = rows
-                            if source_name != "repeatable":
-                                random.shuffle(rows)
-                                if (row_amount := self.rows_amount) > len(rows) > 0:
-                                    if repeatable:
-                                        rows *= math.ceil(row_amount / len(rows))
-                                        random.shuffle(rows)
-                                    else:
-                                        random.shuffle(rows)
-                                    #     raise GeneratorError(ErrorCode.U0019, msg_args=(source_name,))
+        """**Takes the next rows of the sources of this connector, the sources themselves are prepared once per run.**
 
-    def generate(self):
-        row_counter = 0
+        The unique fields of the connector take their next positions too, which fails for a field that doesn't have
+        enough values left for the rows of this run.
+        """
+        self.sources = self._source_cursors.advance(self._connector_config.hierarchy, self.rows_amount)
+        self.unique_offsets = {
+            field_plan.field_code: field_plan.unique.advance(self.rows_amount)
+            for field_plan in self._field_plans[self._connector_config.hierarchy]
+            if field_plan.unique is not None
+        }
+
+    def prepare_columns(self):
+        """Generates the values of all rows at once for the fields that support it, keyed by field code."""
+        self.columns = {}
+        if self.rows_amount < COLUMN_THRESHOLD:
+            return
         hierarchy = self._connector_config.hierarchy
-        for index, row in enumerate(range(self.rows_amount)):
-            row_counter += 1
-            element = {"row_counter": row_counter, "Fields": {}, "Objects": []}
+        rng = self._random_streams.numpy_stream("columns", hierarchy, self._row_path)
+        for field_plan in self._field_plans[hierarchy]:
+            column = field_plan.execute_column(self.rows_amount, rng)
+            if column is not None:
+                self.columns[field_plan.field_code] = column
+
+    def sub_connectors(self, index: int, generated_fields: dict) -> Iterator[Connector]:
+        """The runs of the sub-connectors for the row with the given index."""
+        for connector_config in self._connector_tree.sub_connectors(self._connector_config.hierarchy):
+            yield Connector(
+                connector_tree=self._connector_tree,
+                connector_config=connector_config,
+                source_data=self._source_data,
+                source_cursors=self._source_cursors,
+                source_metainfo=self._source_metainfo,
+                source_index=self._source_index,
+                variables=self._variables,
+                functions_metainfo=self._functions_metainfo,
+                field_plans=self._field_plans,
+                random_streams=self._random_streams,
+                parent_generated_fields=generated_fields,
+                row_path=self._row_path + (index,),
+            )
+
+    def count_rows(self, index: int, rows_amounts: Dict[str, int]):
+        """Adds the rows of the runs of the sub-connectors of a row to the amounts per hierarchy, without generating."""
+        for connector in self.sub_connectors(index, {}):
+            connector.calculate_rows_amount()
+            hierarchy = connector._connector_config.hierarchy
+            rows_amounts[hierarchy] = rows_amounts.get(hierarchy, 0) + connector.rows_amount
+            if self._connector_tree.sub_connectors(hierarchy):
+                for sub_index in range(connector.rows_amount):
+                    connector.count_rows(sub_index, rows_amounts)
+
+    def seek(self, rows_before: Dict[str, int]):
+        """Moves the source cursors and unique fields of the sub-connectors past the rows of their earlier runs."""
+        for hierarchy, rows_amount in rows_before.items():
+            self._source_cursors.seek(hierarchy, rows_amount)
+            for field_plan in self._field_plans[hierarchy]:
+                if field_plan.unique is not None:
+                    field_plan.unique.seek(rows_amount)
+
+    def skip_rows(self, rows: range):
+        """Moves past rows without generating them, like a row that gets `##DELETE`."""
+        for index in rows:
+            self.skip_row(index)
+
+    def skip_row(self, index: int):
+        """**Moves past the sub-connectors of a row without generating them.**
+
+        Advances the source cursors of the sub-connectors like generating them would, so the rows after it get the same
+        values as when it was generated.
+        """
+        for connector in self.sub_connectors(index, {}):
+            connector.calculate_rows_amount()
+            connector.prepare_sources()
+            connector.skip_rows(range(connector.rows_amount))
+
+    def generate(self, rows: Optional[range] = None):
+        """Generates the rows of the connector, or only the given range of them when the run is sharded."""
+        rows = range(self.rows_amount) if rows is None else rows
+        self.generated_data["Element"].extend(self.iter_elements(rows))
+
+    def iter_elements(self, rows: range) -> Iterator[dict]:
+        """Yields the generated elements, a row is dropped as soon as one of its fields gets `##DELETE`."""
+        hierarchy = self._connector_config.hierarchy
+        field_plans = self._field_plans[hierarchy]
+        for index in rows:
+            element = {"row_counter": index + 1, "Fields": {}, "Objects": []}
             generated_fields = {**self._parent_generated_fields, hierarchy: element["Fields"]}
-            for field in self._connector_config.fields_:
-                function_config = attr_find(
-                    iterable=field.functions,
-                    find_attr="order_id",
-                    find_value=0,
-                    error=GeneratorError(ErrorCode.F0003, msg_args=(field.metainfo.label,))
-                )
-                if len(field.functions) > 1:
-                    function = CompositeFunction(
-                        functions=field.functions,
-                        function_config=function_config,
-                        source_data=self._source_data,
-                        source_metainfo=self._source_metainfo,
-                        functions_metainfo=self._functions_metainfo,
-                        variables=self._variables,
-                        generated_fields=generated_fields,
-                        connector_config=field,
-                        row_index=index,
-                        row_amount=self.rows_amount,
-                    )
-                    function.compose_tree()
-                elif len(field.functions) == 1:
-                    function = LeafFunction(
-                        function_config=function_config,
-                        source_data=self._source_data,
-                        source_metainfo=self._source_metainfo,
-                        functions_metainfo=self._functions_metainfo,
-                        variables=self._variables,
-                        generated_fields=generated_fields,
-                        connector_config=field,
-                        row_index=index,
-                        row_amount=self.rows_amount,
-                    )
-                else:
-                    raise GeneratorError(ErrorCode.B0000)
-                try:
-                    value = self._variables.apply(field.custom_row_values[0].input)
-                    field.custom_row_values.pop(0)
-                except (IndexError, AttributeError):
-                    value = None
-                if not value:
-                    value = function.execute()
-                element["Fields"][field.field_code] = value
-
-            for connector_config in self._configurations.connectors:
-                sub_hierarchy = connector_config.hierarchy
-                if sub_hierarchy.startswith(hierarchy) and sub_hierarchy.count("->") == hierarchy.count("->") + 1:
-                    connector = Connector(
-                        configurations=self._configurations,
-                        connector_config=connector_config,
-                        source_data=self._source_data,
-                        full_source_data=self._full_source_data,
-                        source_metainfo=self._source_metainfo,
-                        variables=self._variables,
-                        functions_metainfo=self._functions_metainfo,
-                        parent_generated_fields=generated_fields,
-                    )
+            context = RowContext(
+                row_index=index,
+                row_amount=self.rows_amount,
+                generated_fields=generated_fields,
+                source_data=self.sources,
+                random_streams=self._random_streams,
+                row_key=(hierarchy, self._row_path + (index,)),
+            )
+            for field_plan in field_plans:
+                value = field_plan.custom_row_values.get(index)
+                if value is None:
+                    column = self.columns.get(field_plan.field_code)
+                    if column is not None:
+                        value = column[index]
+                    elif field_plan.unique is None:
+                        value = field_plan.execute(context)
+                    else:
+                        value = field_plan.unique.value(
+                            self.unique_offsets[field_plan.field_code] + index, lambda: field_plan.execute(context)
+                        )
+                if value == DELETE:
+                    self.row_removed = True
+                    self.skip_row(index)
+                    break
+                element["Fields"][field_plan.field_code] = value
+            else:
+                for connector in self.sub_connectors(index, generated_fields):
                     connector.run()
+                    self.row_removed = self.row_removed or connector.row_removed
                     if connector.generated_data["Element"]:
-                        element["Objects"].append({connector_config.name: connector.generated_data})
-            self.generated_data["Element"].append(element)
+                        element["Objects"].append({connector._connector_config.name: connector.generated_data})
+                yield element
 
     def run(self):
-        self.find_active_get_connectors()
         self.calculate_rows_amount()
         self.prepare_sources()
+        self.prepare_columns()
         self.generate()
@@ -1,19 +1,76 @@
-import inspect
+import random
 from abc import ABCMeta, abstractmethod
-from typing import Any, List, Dict
-from datetime import timedelta, datetime
-
-import pydantic.error_wrappers
+from typing import Any, Callable, Hashable, Iterator, List, Dict, Optional, Sequence, Tuple
+import numpy
 
+from dates import csv_date, date_normaliser
 from errors import GeneratorError, ErrorCode
-from generator.functions.methods import Functions, FunctionBase
-from generator.schemas.functions import FunctionsMetaInfo
-from generator.schemas.input import Function as FunctionSchema
+from generator.functions.methods import FUNCTIONS, FunctionBase
+from generator.functions.utils import get_parameter_coercers
+from generator.schemas.functions import DataType, FunctionsMetaInfo, Purity
+from generator.rng import RandomStreams
+from generator.schemas.input import Field as FieldSchema, Function as FunctionSchema
+from generator.sources import SourceIndex
+from generator.unique import UniqueValues
 from generator.utils import attr_find
 from generator.variables import Variables
 
-csv_format = "%m/%d/%y"
-date_format = "%Y-%m-%d"
+# Parameters of leaf functions that differ per row and get taken from the `RowContext`.
+ROW_PARAMETERS = {
+    "bron_waarde": ("source_data", "row_index"),
+    "bron_waarde_met_vaste_waarde": ("row_index", "generated_fields", "row_amount", "run_key"),
+    "veld_waarde": ("generated_fields",),
+}
+PURITY_ORDER = (Purity.constant, Purity.row, Purity.random)
+
+
+class _NotEvaluated:
+    """The value of a function that isn't evaluated yet, still the same object after pickling it for a shard."""
+
+    def __reduce__(self) -> str:
+        return "_NOT_EVALUATED"
+
+
+_NOT_EVALUATED = _NotEvaluated()
+
+
+class RowContext:
+    """The per-row state a compiled function tree gets executed with."""
+    __slots__ = (
+        "row_index", "row_amount", "generated_fields", "source_data", "subexpressions", "_random_streams", "_row_key",
+        "_rng",
+    )
+
+    def __init__(
+            self,
+            row_index: int,
+            row_amount: int,
+            generated_fields: dict,
+            source_data: dict,
+            random_streams: RandomStreams,
+            row_key: Tuple[str, Tuple[int, ...]],
+    ):
+        self.row_index = row_index
+        self.row_amount = row_amount
+        self.generated_fields = generated_fields
+        self.source_data = source_data
+        self.subexpressions: Dict[int, Any] = {}  # The values of the shared subtrees of the row, by id.
+        self._random_streams = random_streams
+        self._row_key = row_key
+        self._rng = None
+
+    @property
+    def run_key(self) -> Tuple[str, Tuple[int, ...]]:
+        """The connector run of the row, its hierarchy and the indices of its parent rows."""
+        hierarchy, row_path = self._row_key
+        return hierarchy, row_path[:-1]
+
+    @property
+    def rng(self) -> random.Random:
+        """The random stream of the row, only created when a function of the row needs it."""
+        if self._rng is None:
+            self._rng = self._random_streams.stream("row", *self._row_key)
+        return self._rng
 
 
 class _Function(metaclass=ABCMeta):
@@ -22,48 +79,119 @@ class _Function(metaclass=ABCMeta):
             function_config: FunctionSchema,
             source_data: dict,
             source_metainfo: dict,
+            source_index: SourceIndex,
             functions_metainfo: FunctionsMetaInfo,
             variables: Variables,
-            generated_fields: dict,
             connector_config,
-            row_index: int,
-            row_amount: int,
     ):
         self.function_config = function_config
         self.metainfo = self.function_config.metainfo
         self._source_data = source_data
         self._source_metainfo = source_metainfo
+        self._source_index = source_index
         self._functions_metainfo = functions_metainfo
         self._variables = variables
-        self.generated_fields = generated_fields
         self.connector_config = connector_config
-        self.row_index = row_index
-        self.row_amount = row_amount
         for field in connector_config:
             self.connector_field_config = field
 
-    def _execute_method(self, parameters: dict) -> Any:
-        for function_cls in Functions.__dict__.values():
-            if inspect.isclass(function_cls) \
-                    and issubclass(function_cls, FunctionBase) \
-                    and self.function_config.metainfo.name == function_cls._metainfo.name:
-                try:
-                    function = function_cls(**parameters)
-                    value = function.method()
-                    try:
-                        value = datetime.strptime(value, csv_format).strftime(date_format)
-                    except (ValueError, TypeError):
-                        pass
-                    return value
-                except pydantic.error_wrappers.ValidationError:
-                    return "##DELETE"
-        else:
+        try:
+            self._function_cls = FUNCTIONS[self.metainfo.name]
+        except KeyError:
             raise GeneratorError(ErrorCode.B0000)
+        self._coercers: Dict[str, Callable[[Any], Any]] = get_parameter_coercers(self._function_cls, self.metainfo)
+        self._required = {name for name, field in self._function_cls.__fields__.items() if field.required}
+        # Only a string can be a date from a csv source that still has to be re-formatted.
+        self._may_return_date = any(
+            data_type in (DataType.str, DataType.str.name) for data_type in self.metainfo.return_data_types
+        )
+        # Set by `FieldPlan` for the function of a field with a data type, the values of parameters aren't typed.
+        self.normalise_date: Callable[[Any], Any] = csv_date
+        self._has_column_mode = self._function_cls.call_column.__func__ is not FunctionBase.call_column.__func__
+        self.purity: Purity = self.metainfo.purity
+        self.subexpression_id: Optional[int] = None  # Set by `optimise_field_plans` if the subtree is shared.
+        self._value = _NOT_EVALUATED
+
+    @property
+    def row_invariant(self) -> bool:
+        """Whether the function returns the same value for every row, it then gets evaluated once per run."""
+        return self.purity == Purity.constant
+
+    @abstractmethod
+    def signature(self) -> Hashable:
+        """Identifies the subtree, identical subtrees have the same signature."""
+        pass
+
+    def walk(self) -> Iterator["_Function"]:
+        """Yields the function and the functions of its subtree."""
+        yield self
+
+    def _coerce(self, parameters: dict) -> dict:
+        """Coerces the parameters to the data types of the metainfo, raises a TypeError or ValueError if invalid."""
+        for name, value in parameters.items():
+            if name in self._coercers:
+                parameters[name] = self._coercers[name](value)
+        return parameters
+
+    def _format_value(self, value: Any) -> Any:
+        if self._may_return_date:
+            return self.normalise_date(value)
+        return value
+
+    def _execute_method(self, parameters: dict, context: Optional[RowContext]) -> Any:
+        rng = context.rng if self._function_cls.uses_rng else None
+        return self._format_value(self._function_cls.call(parameters, rng))
+
+    @abstractmethod
+    def _evaluate(self, context: Optional[RowContext]) -> Any:
+        pass
+
+    def execute(self, context: Optional[RowContext]) -> Any:
+        if self.row_invariant:
+            if self._value is _NOT_EVALUATED:
+                self._value = self._evaluate(context)
+            return self._value
+        if self.subexpression_id is None:
+            return self._evaluate(context)
+        try:
+            return context.subexpressions[self.subexpression_id]
+        except KeyError:
+            value = context.subexpressions[self.subexpression_id] = self._evaluate(context)
+            return value
+
+    def execute_constant(self) -> Any:
+        """Executes a row-invariant function, without the context of a row."""
+        return self.execute(None)
 
     @abstractmethod
-    def execute(self):
+    def constant_parameters(self) -> Optional[dict]:
+        """The parameters if they are the same for every row, else `None`."""
         pass
 
+    def column_parameters(self) -> Optional[dict]:
+        """The parameters if they are the same for every row and the function has a column mode, else `None`."""
+        return self.constant_parameters() if self._has_column_mode else None
+
+    def unique_domain(self) -> Optional[Sequence]:
+        """All values the function can return if its parameters are the same for every row, see `UniqueValues`."""
+        parameters = self.constant_parameters()
+        if parameters is None:
+            return None
+        domain = self._function_cls.unique_domain(parameters)
+        if domain is not None and self._may_return_date and not isinstance(domain, range):
+            domain = tuple(dict.fromkeys(self._format_value(value) for value in domain))
+        return domain
+
+    def execute_column(self, rows_amount: int, rng: numpy.random.Generator) -> Optional[list]:
+        """Executes the function for all rows of a connector run at once, `None` if it has to be done per row."""
+        parameters = self.column_parameters()
+        if parameters is None:
+            return None
+        values = self._function_cls.call_column(parameters, rows_amount, rng)
+        if values is not None and self._may_return_date:
+            values = [self._format_value(value) for value in values]
+        return values
+
 
 class CompositeFunction(_Function):
     def __init__(
@@ -72,18 +200,15 @@ class CompositeFunction(_Function):
             function_config: FunctionSchema,
             source_data: dict,
             source_metainfo: dict,
+            source_index: SourceIndex,
             functions_metainfo: FunctionsMetaInfo,
             variables: Variables,
-            generated_fields: dict,
             connector_config,
-            row_index: int,
-            row_amount: int,
     ):
-        self._parameter_name = None
-        self._parameter_values = None
+        self._literal_inputs: Dict[str, str] = {}  # The parameters that are given as a value instead of a function.
         self._functions = functions
-        super().__init__(function_config, source_data, source_metainfo, functions_metainfo, variables,
-                         generated_fields, connector_config, row_index, row_amount)
+        super().__init__(function_config, source_data, source_metainfo, source_index, functions_metainfo, variables,
+                         connector_config)
         self._tree: Dict[str, _Function] = {}
 
     def compose_tree(self):
@@ -92,10 +217,10 @@ class CompositeFunction(_Function):
                 parameter_function_id = int(parameter.input)
             except ValueError:
                 if parameter.input == "True" or parameter.input == "False" or parameter.name == "operator":
-                    self._parameter_name = parameter.name
-                    self._parameter_values = parameter.input
+                    self._literal_inputs[parameter.name] = parameter.input
+                    continue
                 elif self.function_config.method_id == 2:
-                    return ""
+                    break
                 else:
                     raise GeneratorError(ErrorCode.B0011,
                                          msg_args=(
@@ -115,12 +240,10 @@ class CompositeFunction(_Function):
                     function_config=parameter_function_config,
                     source_data=self._source_data,
                     source_metainfo=self._source_metainfo,
+                    source_index=self._source_index,
                     functions_metainfo=self._functions_metainfo,
                     variables=self._variables,
-                    generated_fields=self.generated_fields,
                     connector_config=self.connector_config,
-                    row_index=self.row_index,
-                    row_amount=self.row_amount,
                 )
                 parameter_function.compose_tree()
             else:
@@ -128,36 +251,110 @@ class CompositeFunction(_Function):
                     function_config=parameter_function_config,
                     source_data=self._source_data,
                     source_metainfo=self._source_metainfo,
+                    source_index=self._source_index,
                     functions_metainfo=self._functions_metainfo,
                     variables=self._variables,
-                    generated_fields=self.generated_fields,
                     connector_config=self.connector_config,
-                    row_index=self.row_index,
-                    row_amount=self.row_amount,
                 )
             self._tree[parameter.name] = parameter_function
 
-    def execute(self):
+        try:
+            self._literal_parameters = self._coerce(
+                {name: value for name, value in self._literal_inputs.items() if value}
+            )
+        except (TypeError, ValueError):
+            self._literal_parameters = None
+        self._missing_required = bool(self._required - set(self._tree) - set(self._literal_parameters or ()))
+        self.purity = max(
+            (self.purity, *(function.purity for function in self._tree.values())), key=PURITY_ORDER.index
+        )
+
+    def signature(self) -> Hashable:
+        parameters = []
+        for parameter in self.function_config.parameters:
+            function = self._tree.get(parameter.name)
+            parameters.append((parameter.name, parameter.input if function is None else function.signature()))
+        return self.metainfo.name, tuple(parameters)
+
+    def walk(self) -> Iterator[_Function]:
+        yield self
+        for function in self._tree.values():
+            yield from function.walk()
+
+    def _evaluate(self, context: Optional[RowContext]) -> Any:
+        """**Executes the children in the order of the parameters, then the method.**
+
+        The lazy parameters of the method (the branches of 'als_dan') are executed last, and only the one the method
+        chooses with the other parameters. The functions of the other lazy parameters don't run at all, so they use no
+        random values of the row.
+        """
+        lazy_parameters = self._function_cls.lazy_parameters
         parameters = {
-            parameter: parameter_function.execute()
+            parameter: parameter_function.execute(context)
             for parameter, parameter_function in self._tree.items()
+            if parameter not in lazy_parameters
         }
+        if self._literal_parameters is None or self._missing_required:
+            return "##DELETE"
+        try:
+            parameters = self._coerce(parameters)
+        except (TypeError, ValueError):
+            return "##DELETE"
+        parameters.update(self._literal_parameters)
+        if lazy_parameters:
+            chosen = self._function_cls.choose_parameter(parameters)
+            chosen_parameters = lazy_parameters if chosen is None else (chosen,)
+            parameters.update(dict.fromkeys(parameter for parameter in lazy_parameters if parameter in self._tree))
+            try:
+                parameters.update(self._coerce({
+                    parameter: self._tree[parameter].execute(context)
+                    for parameter in chosen_parameters
+                    if parameter in self._tree
+                }))
+            except (TypeError, ValueError):
+                return "##DELETE"
+        return self._execute_method(parameters, context)
+
+    def constant_parameters(self) -> Optional[dict]:
+        if self._literal_parameters is None or self._missing_required:
+            return None
+        if not all(function.row_invariant for function in self._tree.values()):
+            return None
+        parameters = {}
+        for parameter, parameter_function in self._tree.items():
+            parameters[parameter] = parameter_function.execute_constant()
         try:
-            if bool(self._parameter_values):
-                parameters[self._parameter_name] = self._parameter_values
-            return self._execute_method(parameters)
-        # This try except is for if Profit returns a None as value, and it needs to be an integer.
-        except pydantic.error_wrappers.ValidationError:
-            for (key, value) in parameters.items():
-                if value is None:
-                    parameters[key] = 0
-            if bool(self._parameter_values):
-                parameters[self._parameter_name] = self._parameter_values
-            return self._execute_method(parameters)
+            parameters = self._coerce(parameters)
+        except (TypeError, ValueError):
+            return None
+        parameters.update(self._literal_parameters)
+        return parameters
 
 
 class LeafFunction(_Function):
-    def execute(self) -> Any:
+    def __init__(
+            self,
+            function_config: FunctionSchema,
+            source_data: dict,
+            source_metainfo: dict,
+            source_index: SourceIndex,
+            functions_metainfo: FunctionsMetaInfo,
+            variables: Variables,
+            connector_config,
+    ):
+        super().__init__(function_config, source_data, source_metainfo, source_index, functions_metainfo, variables,
+                         connector_config)
+        self._row_parameters = ROW_PARAMETERS.get(self.metainfo.name, ())
+        try:
+            self._parameters = self._coerce(self._bind_parameters())
+        except (TypeError, ValueError):
+            self._parameters = None
+        if self._parameters is not None and not self._required.issubset(
+                (*self._parameters, *self._row_parameters)):
+            self._parameters = None
+
+    def _bind_parameters(self) -> dict:
+        """Binds the parameters that are the same for every row, so executing only adds the row specific ones."""
         if self.metainfo.allow_child_functions:
             try:
                 raise GeneratorError(ErrorCode.B0010,
@@ -170,17 +367,9 @@ class LeafFunction(_Function):
         parameters = {param.name: param.input for param in self.function_config.parameters}
         if function_name == "vaste_waarde":
             parameters["variables"] = self._variables
-        elif function_name == "bron_waarde":
-            parameters["source_data"] = self._source_data
-            parameters["row_index"] = self.row_index
         elif function_name == "bron_waarde_met_vaste_waarde":
-            parameters["source_data"] = self._source_data
-            parameters["row_index"] = self.row_index
-            parameters["generated_fields"] = self.generated_fields
-            parameters["row_amount"] = self.row_amount
+            parameters["source_index"] = self._source_index
             parameters["field_name"] = self.connector_field_config[1].label
-        elif function_name == "veld_waarde":
-            parameters["generated_fields"] = self.generated_fields
         elif function_name == "random_selectie":
             if self.connector_config.metainfo.values is None:
                 raise GeneratorError(error_code=ErrorCode.U0018, msg_args=(self.connector_config.metainfo.label,))
@@ -188,4 +377,116 @@ class LeafFunction(_Function):
                 parameters["values"] = self.connector_config.metainfo
         elif function_name == "random_boolean":
             parameters["values"] = ('True', 'False')
-        return self._execute_method(parameters)
+        return parameters
+
+    def signature(self) -> Hashable:
+        parameters = self.function_config.parameters
+        return self.metainfo.name, tuple((parameter.name, parameter.input) for parameter in parameters)
+
+    def _evaluate(self, context: Optional[RowContext]) -> Any:
+        if self._parameters is None:
+            return "##DELETE"
+        parameters = dict(self._parameters)
+        for name in self._row_parameters:
+            parameters[name] = getattr(context, name)
+        return self._execute_method(parameters, context)
+
+    def constant_parameters(self) -> Optional[dict]:
+        if self._row_parameters or self._parameters is None:
+            return None
+        return dict(self._parameters)
+
+
+class FieldPlan:
+    """**The compiled function tree of a single field.**
+
+    The tree shape, the parameter binding and the metainfo lookups of a field are the same for every row, so they are
+    resolved once per run. Generating a row then only executes the plan with the context of that row.
+
+    Functions that only depend on constants return the same value for every row, they are evaluated once per run.
+
+    The custom row values of the field are resolved once as well, by the index of the row they replace. The
+    configurations of the field itself are never changed, so they can be reused by another run.
+    """
+
+    def __init__(
+            self,
+            field: FieldSchema,
+            source_data: dict,
+            source_metainfo: dict,
+            source_index: SourceIndex,
+            functions_metainfo: FunctionsMetaInfo,
+            variables: Variables,
+    ):
+        self.field = field
+        function_config = attr_find(
+            iterable=field.functions,
+            find_attr="order_id",
+            find_value=0,
+            error=GeneratorError(ErrorCode.F0003, msg_args=(field.metainfo.label,))
+        )
+        if len(field.functions) > 1:
+            function = CompositeFunction(
+                functions=field.functions,
+                function_config=function_config,
+                source_data=source_data,
+                source_metainfo=source_metainfo,
+                source_index=source_index,
+                functions_metainfo=functions_metainfo,
+                variables=variables,
+                connector_config=field,
+            )
+            function.compose_tree()
+        elif len(field.functions) == 1:
+            function = LeafFunction(
+                function_config=function_config,
+                source_data=source_data,
+                source_metainfo=source_metainfo,
+                source_index=source_index,
+                functions_metainfo=functions_metainfo,
+                variables=variables,
+                connector_config=field,
+            )
+        else:
+            raise GeneratorError(ErrorCode.B0000)
+        if field.metainfo is not None:
+            function.normalise_date = date_normaliser(field.metainfo.dataType, csv_date)
+        self.function = function
+        self.unique: Optional[UniqueValues] = None  # Set by the engine for a field with unique values.
+        self.custom_row_values: Dict[int, str] = {}
+        for custom_row_value in field.custom_row_values or ():
+            value = variables.apply(custom_row_value.input)
+            if value:  # An empty custom row value leaves the generated value.
+                self.custom_row_values[custom_row_value.row] = value
+
+    @property
+    def field_code(self) -> str:
+        return self.field.field_code
+
+    def execute(self, context: RowContext) -> Any:
+        return self.function.execute(context)
+
+    def execute_column(self, rows_amount: int, rng: numpy.random.Generator) -> Optional[list]:
+        if self.unique is not None:
+            return None
+        return self.function.execute_column(rows_amount, rng)
+
+
+def optimise_field_plans(field_plans: List[FieldPlan]):
+    """**Shares the identical subtrees of the fields of a connector, so they are evaluated once per row.**
+
+    Only subtrees that read the row without random functions get shared, the value of a random subtree has to differ
+    per field. Row-invariant subtrees are already evaluated once per run, see `_Function.execute`.
+    """
+    counts: Dict[Hashable, int] = {}
+    functions: List[Tuple[Hashable, _Function]] = []
+    for field_plan in field_plans:
+        for function in field_plan.function.walk():
+            if function.purity == Purity.row:
+                signature = function.signature()
+                counts[signature] = counts.get(signature, 0) + 1
+                functions.append((signature, function))
+    subexpression_ids: Dict[Hashable, int] = {}
+    for signature, function in functions:
+        if counts[signature] > 1:
+            function.subexpression_id = subexpression_ids.setdefault(signature, len(subexpression_ids))
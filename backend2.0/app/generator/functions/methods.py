@@ -1,10 +1,17 @@
+import inspect
+import operator
 import random
 from abc import abstractmethod
-from typing import Any
+from typing import Any, Callable, ClassVar, Dict, Optional, Sequence, Tuple, Type
 from datetime import timedelta, datetime
 
-from generator.schemas.functions import DataType, FunctionMetaInfo, ParameterMetaInfo
-from generator.functions.utils import format_date, DATE_FORMAT, bank_codes, LETTERS, country_code
+import numpy
+
+from generator.schemas.functions import DataType, FunctionMetaInfo, ParameterMetaInfo, Purity
+from generator.business_days import count_days, offset_days, to_date
+from dates import DATE_FORMAT, parse_date
+from generator.functions.utils import bank_codes, LETTERS, country_code
+from generator.sources import SourceIndex
 from errors import GeneratorError, ErrorCode
 from pydantic import validator, BaseModel
 
@@ -12,6 +19,11 @@ from generator.variables import Variables
 
 
 class FunctionBase(BaseModel):
+    rng: Optional[random.Random] = None  # The random stream of the row, see `generator.rng.RandomStreams`.
+    uses_rng: ClassVar[bool] = False  # Only functions that use it get the random stream of the row.
+    # Parameters of which only the one chosen by `choose_parameter` gets evaluated, the others are `None`.
+    lazy_parameters: ClassVar[Tuple[str, ...]] = ()
+
     class Config:
         arbitrary_types_allowed = True
 
@@ -24,6 +36,36 @@ class FunctionBase(BaseModel):
     def method(self):
         pass
 
+    @classmethod
+    def call(cls, parameters: dict, rng: Optional[random.Random]) -> Any:
+        """Executes the method without validation, the parameters have to be coerced already."""
+        return cls.construct(rng=rng, **parameters).method()
+
+    @classmethod
+    def choose_parameter(cls, parameters: dict) -> Optional[str]:
+        """**Chooses the lazy parameter the method needs, from the coerced values of the other parameters.**
+
+        `None` evaluates all lazy parameters, like the other parameters. Methods with `lazy_parameters` override it.
+        """
+        return None
+
+    @classmethod
+    def call_column(cls, parameters: dict, rows_amount: int, rng: numpy.random.Generator) -> Optional[list]:
+        """**Executes the method for a whole column of rows at once.**
+
+        Only used when the parameters are the same for every row. Returns `None` if the function has no column mode
+        for the parameters, the rows then get generated one by one with `call`.
+        """
+        return None
+
+    @classmethod
+    def unique_domain(cls, parameters: dict) -> Optional[Sequence]:
+        """**All values the method can return for the parameters, each once, `None` if they can't be listed.**
+
+        A field with unique values then takes them from a permutation of the domain instead of calling the method.
+        """
+        return None
+
 
 class Functions:
     class ConstantValue(FunctionBase):
@@ -34,6 +76,7 @@ class Functions:
         _metainfo = FunctionMetaInfo(
             name="vaste_waarde",
             return_data_types=[DataType.str],
+            purity=Purity.constant,
             parameters=[
                 ParameterMetaInfo(name="waarde", data_types=[DataType.str], allow_child_functions=False),
             ],
@@ -48,6 +91,7 @@ class Functions:
         _metainfo = FunctionMetaInfo(
             name="waarde_uit_profit",
             return_data_types=[DataType.str],
+            purity=Purity.constant,
             parameters=[
                 ParameterMetaInfo(name="waarde", data_types=[DataType.any], allow_child_functions=False)
             ],
@@ -67,6 +111,7 @@ class Functions:
         _metainfo = FunctionMetaInfo(
             name="bron_waarde",
             return_data_types=[DataType.str],
+            purity=Purity.row,
             horizontal_parameters=True,
             parameters=[
                 ParameterMetaInfo(name="get_connector", data_types=[DataType.str], allow_child_functions=False),
@@ -95,15 +140,17 @@ class Functions:
         fixed_value_function: str
         fixed_value: str
 
-        source_data: dict
+        source_index: SourceIndex
         row_index: int
         generated_fields: dict
         row_amount: int
+        run_key: tuple
         field_name: str
 
         _metainfo = FunctionMetaInfo(
             name="bron_waarde_met_vaste_waarde",
             return_data_types=[DataType.str],
+            purity=Purity.row,
             parameters=[
                 ParameterMetaInfo(name="get_connector", data_types=[DataType.str], allow_child_functions=False),
                 ParameterMetaInfo(name="get_connector_field", data_types=[DataType.str], allow_child_functions=False),
@@ -143,10 +190,9 @@ class Functions:
                     # errorhandling voor vaste waarde
                     pass
 
-            current_source_data = []
-            for index, item in enumerate(self.source_data[self.get_connector]):
-                if item[self.fixed_get_connector_field] == self.fixed_value:
-                    current_source_data.append(item)
+            current_source_data = self.source_index.lookup(
+                self.get_connector, self.fixed_get_connector_field, self.fixed_value, self.run_key
+            )
             try:
                 value = current_source_data[self.row_index][self.get_connector_field]
             except IndexError:
@@ -169,6 +215,7 @@ class Functions:
         _metainfo = FunctionMetaInfo(
             name="veld_waarde",
             return_data_types=[DataType.str],
+            purity=Purity.row,
             horizontal_parameters=True,
             parameters=[
                 ParameterMetaInfo(name="connector", data_types=[DataType.str], allow_child_functions=False),
@@ -185,6 +232,8 @@ class Functions:
     class RandomSelection(FunctionBase):
         values: Any
 
+        uses_rng = True
+
         _metainfo = FunctionMetaInfo(
             name="random_selectie",
             return_data_types=[DataType.str],
@@ -197,13 +246,32 @@ class Functions:
             except AttributeError:
                 raise GeneratorError(error_code=ErrorCode.U0018)
             try:
-                return random.choices(self.values)[0]
+                return self.rng.choices(self.values)[0]
             except IndexError:
                 return
 
+        @classmethod
+        def call_column(cls, parameters: dict, rows_amount: int, rng: numpy.random.Generator) -> Optional[list]:
+            try:
+                values = tuple(value.id for value in parameters.get("values").values)
+            except AttributeError:
+                raise GeneratorError(error_code=ErrorCode.U0018)
+            if not values:
+                return [None] * rows_amount
+            return [values[index] for index in rng.integers(0, len(values), size=rows_amount).tolist()]
+
+        @classmethod
+        def unique_domain(cls, parameters: dict) -> Optional[Sequence]:
+            try:
+                return tuple(dict.fromkeys(value.id for value in parameters.get("values").values))
+            except AttributeError:
+                raise GeneratorError(error_code=ErrorCode.U0018)
+
     class RandomBoolean(FunctionBase):
         values: Any
 
+        uses_rng = True
+
         _metainfo = FunctionMetaInfo(
             name="random_boolean",
             return_data_types=[DataType.boolean],
@@ -212,7 +280,16 @@ class Functions:
         )
 
         def method(self) -> bool:
-            return random.choices(self.values)[0]
+            return self.rng.choices(self.values)[0]
+
+        @classmethod
+        def call_column(cls, parameters: dict, rows_amount: int, rng: numpy.random.Generator) -> Optional[list]:
+            values = parameters["values"]
+            return [values[index] for index in rng.integers(0, len(values), size=rows_amount).tolist()]
+
+        @classmethod
+        def unique_domain(cls, parameters: dict) -> Optional[Sequence]:
+            return tuple(dict.fromkeys(parameters["values"]))
 
     class RandomNumber(FunctionBase):
         minimale_waarde: int
@@ -220,6 +297,8 @@ class Functions:
         aantal_decimalen: int
         stapgrootte: int
 
+        uses_rng = True
+
         _metainfo = FunctionMetaInfo(
             name="random_getal",
             return_data_types=[DataType.int],
@@ -266,15 +345,44 @@ class Functions:
             self._steps_larger_than_one(self.stapgrootte)
 
             return round(
-                random.randrange(self.minimale_waarde, self.maximale_waarde + 1, self.stapgrootte),
+                self.rng.randrange(self.minimale_waarde, self.maximale_waarde + 1, self.stapgrootte),
                 self.aantal_decimalen,
             )
 
+        @classmethod
+        def call_column(cls, parameters: dict, rows_amount: int, rng: numpy.random.Generator) -> Optional[list]:
+            minimum, maximum = parameters["minimale_waarde"], parameters["maximale_waarde"]
+            step, decimals = parameters["stapgrootte"], parameters["aantal_decimalen"]
+            cls._max_greater_than_min(minimum, maximum)
+            cls._steps_larger_than_one(step)
+            steps = len(range(minimum, maximum + 1, step))
+            if not steps or not -2 ** 62 < minimum <= maximum < 2 ** 62:  # Left to `randrange` and Python integers.
+                return None
+            values = (minimum + step * rng.integers(0, steps, size=rows_amount)).tolist()
+            if decimals < 0:  # Rounding an integer to zero or more decimals leaves it as it is.
+                values = [round(value, decimals) for value in values]
+            return values
+
+        @classmethod
+        def unique_domain(cls, parameters: dict) -> Optional[Sequence]:
+            cls._max_greater_than_min(parameters["minimale_waarde"], parameters["maximale_waarde"])
+            cls._steps_larger_than_one(parameters["stapgrootte"])
+            if parameters["aantal_decimalen"] < 0:  # Rounding to tens or more makes values equal.
+                return None
+            domain = range(parameters["minimale_waarde"], parameters["maximale_waarde"] + 1, parameters["stapgrootte"])
+            try:
+                len(domain)
+            except OverflowError:
+                return None
+            return domain
+
     class RandomDecimalNumber(FunctionBase):
         minimale_waarde: float
         maximale_waarde: float
         aantal_decimalen: int
 
+        uses_rng = True
+
         _metainfo = FunctionMetaInfo(
             name="random_decimaal_getal",
             return_data_types=[DataType.decimal],
@@ -306,12 +414,22 @@ class Functions:
 
         def method(self) -> float:
             self._max_greater_than_min(self.minimale_waarde, self.maximale_waarde)
-            return round(random.uniform(self.minimale_waarde, self.maximale_waarde), self.aantal_decimalen)
+            return round(self.rng.uniform(self.minimale_waarde, self.maximale_waarde), self.aantal_decimalen)
+
+        @classmethod
+        def call_column(cls, parameters: dict, rows_amount: int, rng: numpy.random.Generator) -> Optional[list]:
+            minimum, maximum = parameters["minimale_waarde"], parameters["maximale_waarde"]
+            decimals = parameters["aantal_decimalen"]
+            cls._max_greater_than_min(minimum, maximum)
+            return [round(value, decimals) for value in rng.uniform(minimum, maximum, size=rows_amount).tolist()]
 
     class RandomDate(FunctionBase):  # Moet nog verder getest worden als de value in de JSON wordt gezet op de front-end
         begin_datum: str
         eind_datum: str
         weekend_dagen_meenemen: bool
+        feestdagen_meenemen: bool = True
+
+        uses_rng = True
 
         _metainfo = FunctionMetaInfo(
             name="genereer_random_datum",
@@ -343,6 +461,23 @@ class Functions:
                     default_value=False,
                     allow_child_functions=False,
                 ),
+                ParameterMetaInfo(
+                    name="feestdagen_meenemen",
+                    data_types=[DataType.boolean],
+                    values=[
+                        {
+                            "id": "True",
+                            "description": True,
+                        },
+                        {
+                            "id": "False",
+                            "description": False,
+                        },
+                    ],
+                    default_value=True,
+                    optional=True,
+                    allow_child_functions=False,
+                ),
             ],
         )
 
@@ -354,33 +489,51 @@ class Functions:
             return days_between_dates
 
         def method(self) -> str:
-            first_date = format_date(self.begin_datum)
-            last_date = format_date(self.eind_datum)
-
+            """A random date between the dates, every day that counts has the same chance."""
+            first_date = parse_date(self.begin_datum).date()
+            last_date = parse_date(self.eind_datum).date()
             days_between_dates = self._end_date_later_then_begin_date(first_date, last_date)
 
-            if days_between_dates == 0:
-                random_date = first_date
+            if self.weekend_dagen_meenemen and self.feestdagen_meenemen:
+                random_date = first_date + timedelta(days=self.rng.randrange(0, days_between_dates + 1))
             else:
-                random_number_of_days = random.randrange(0, days_between_dates + 1)
-                random_date = first_date + timedelta(days=random_number_of_days)
-
-            if not self.weekend_dagen_meenemen:
-                if random_date.isoweekday() == 6:
-                    random_date += timedelta(days=2)
-                elif random_date.isoweekday() == 7:
-                    random_date += timedelta(days=1)
-
+                days = int(count_days(first_date, last_date + timedelta(days=1), self.weekend_dagen_meenemen,
+                                      self.feestdagen_meenemen))
+                # Without days that count in between, the first date moves to the next day that counts.
+                random_date = to_date(offset_days(first_date, self.rng.randrange(0, days) if days else 0,
+                                                  self.weekend_dagen_meenemen, self.feestdagen_meenemen))
             return random_date.strftime(DATE_FORMAT)
 
+        @classmethod
+        def call_column(cls, parameters: dict, rows_amount: int, rng: numpy.random.Generator) -> Optional[list]:
+            first_date = parse_date(parameters["begin_datum"]).date()
+            last_date = parse_date(parameters["eind_datum"]).date()
+            days_between_dates = cls._end_date_later_then_begin_date(first_date, last_date)
+            if first_date.year < 1000:  # `strftime` doesn't pad those years with zeros.
+                return None
+
+            weekends = parameters["weekend_dagen_meenemen"]
+            holidays = parameters.get("feestdagen_meenemen", True)
+            if weekends and holidays:
+                random_dates = numpy.datetime64(first_date, "D") + rng.integers(
+                    0, days_between_dates + 1, size=rows_amount
+                )
+            else:
+                days = int(count_days(first_date, last_date + timedelta(days=1), weekends, holidays))
+                offsets = rng.integers(0, days, size=rows_amount) if days else numpy.zeros(rows_amount, numpy.int64)
+                random_dates = offset_days(first_date, offsets, weekends, holidays)
+            return numpy.datetime_as_string(random_dates, unit="D").tolist()
+
     class AddingExtraDays(FunctionBase):
         originele_datum: str
         extra_dagen: int
         weekend_dagen_meenemen: bool
+        feestdagen_meenemen: bool = True
 
         _metainfo = FunctionMetaInfo(
             name="extra_dagen_optellen",
             return_data_types=[DataType.str],
+            purity=Purity.constant,
             parameters=[
                 ParameterMetaInfo(
                     name="originele_datum",
@@ -407,19 +560,33 @@ class Functions:
                     ],
                     default_value=False,
                     allow_child_functions=False,
-                )
+                ),
+                ParameterMetaInfo(
+                    name="feestdagen_meenemen",
+                    data_types=[DataType.boolean],
+                    values=[
+                        {
+                            "id": "True",
+                            "description": True,
+                        },
+                        {
+                            "id": "False",
+                            "description": False,
+                        },
+                    ],
+                    default_value=True,
+                    optional=True,
+                    allow_child_functions=False,
+                ),
             ]
         )
 
         def method(self) -> str:
-            new_date = format_date(self.originele_datum) + timedelta(days=self.extra_dagen)
-
-            if not self.weekend_dagen_meenemen:
-                if new_date.isoweekday() == 6:
-                    new_date += timedelta(days=2)
-                elif new_date.isoweekday() == 7:
-                    new_date += timedelta(days=1)
-
+            """Adds the days, a date that doesn't count moves to the next day that counts."""
+            new_date = parse_date(self.originele_datum) + timedelta(days=self.extra_dagen)
+            if not (self.weekend_dagen_meenemen and self.feestdagen_meenemen):
+                new_date = to_date(offset_days(new_date.date(), 0, self.weekend_dagen_meenemen,
+                                               self.feestdagen_meenemen))
             return new_date.strftime(DATE_FORMAT)
 
     class SumValues(FunctionBase):
@@ -430,6 +597,7 @@ class Functions:
         _metainfo = FunctionMetaInfo(
             name="waardes_optellen",
             return_data_types=[DataType.decimal],
+            purity=Purity.constant,
             parameters=[
                 ParameterMetaInfo(
                     name="eerste_waarde",
@@ -466,6 +634,7 @@ class Functions:
         _metainfo = FunctionMetaInfo(
             name="waardes_aftrekken",
             return_data_types=[DataType.decimal],
+            purity=Purity.constant,
             parameters=[
                 ParameterMetaInfo(
                     name="eerste_waarde",
@@ -502,6 +671,7 @@ class Functions:
         _metainfo = FunctionMetaInfo(
             name="waardes_vermenigvuldigen",
             return_data_types=[DataType.decimal],
+            purity=Purity.constant,
             parameters=[
                 ParameterMetaInfo(
                     name="eerste_waarde",
@@ -538,6 +708,7 @@ class Functions:
         _metainfo = FunctionMetaInfo(
             name="waardes_delen",
             return_data_types=[DataType.decimal],
+            purity=Purity.constant,
             parameters=[
                 ParameterMetaInfo(
                     name="eerste_waarde",
@@ -576,6 +747,7 @@ class Functions:
         _metainfo = FunctionMetaInfo(
             name="tekst_samenvoegen",
             return_data_types=[DataType.str],
+            purity=Purity.constant,
             parameters=[
                 ParameterMetaInfo(
                     name="eerste_waarde",
@@ -630,6 +802,8 @@ class Functions:
 
     class RandomBSN(FunctionBase):
 
+        uses_rng = True
+
         _metainfo = FunctionMetaInfo(
             name="random_bsn",
             return_data_types=[DataType.str],
@@ -637,22 +811,33 @@ class Functions:
             parameters=[]
         )
 
-        @classmethod
-        def _validate_bsn(cls, bsn_number: int):
-            bsn_numbers = [index for index in range(len(str(bsn_number)), 0, -1)]
-            bsn_position = [int(char) for char in str(bsn_number)]
-            bsn_numbers[-1] = -1
+        # The weights of the first 8 digits in the 11-test, the check digit has weight -1.
+        _weights = (9, 8, 7, 6, 5, 4, 3, 2)
 
-            output = sum((x * y) for x, y in zip(bsn_numbers, bsn_position))
-            return output % 11 == 0
+        @classmethod
+        def _check_digits(cls, prefixes: numpy.ndarray) -> numpy.ndarray:
+            """The check digits of the 8 digit prefixes, 10 for the prefixes without a valid check digit."""
+            digits = prefixes[:, None] // 10 ** numpy.arange(7, -1, -1) % 10
+            return digits @ numpy.array(cls._weights) % 11
 
         def method(self) -> Any:
-            for i in range(100000):
-                possible_bsn = random.randint(10000000, 999999999)
-                valid_bsn = self._validate_bsn(possible_bsn)
-                if valid_bsn:
-                    return str(possible_bsn)
-            raise ArithmeticError()
+            """Draws the first 8 digits and solves the 11-test for the check digit, so every BSN is valid."""
+            while True:
+                prefix = self.rng.randrange(10 ** 6, 10 ** 8)
+                check_digit = sum(weight * int(digit) for weight, digit in zip(self._weights, f"{prefix:08d}")) % 11
+                if check_digit < 10:
+                    return str(prefix * 10 + check_digit)
+
+        @classmethod
+        def call_column(cls, parameters: dict, rows_amount: int, rng: numpy.random.Generator) -> Optional[list]:
+            values = []
+            while len(values) < rows_amount:
+                # One in 11 prefixes has no valid check digit, so a few more get drawn than are needed.
+                prefixes = rng.integers(10 ** 6, 10 ** 8, size=(rows_amount - len(values)) * 12 // 11 + 1)
+                check_digits = cls._check_digits(prefixes)
+                valid = check_digits < 10
+                values.extend(map(str, (prefixes[valid] * 10 + check_digits[valid]).tolist()))
+            return values[:rows_amount]
 
     class IfElse(FunctionBase):
         waarde_genereren: Any
@@ -661,9 +846,21 @@ class Functions:
         dan_waarde: Any
         anders: Any
 
+        # Only the branch that the condition chooses gets generated, so a skipped branch uses no random values.
+        lazy_parameters = ("dan_waarde", "anders")
+        OPERATORS: ClassVar[Dict[str, Callable[[str, str], bool]]] = {
+            "Gelijk aan": operator.eq,
+            "Ongelijk aan": operator.ne,
+            "Kleiner dan": operator.lt,
+            "Kleiner dan of gelijk aan": operator.le,
+            "Groter dan": operator.gt,
+            "Groter dan of gelijk aan": operator.ge,
+        }
+
         _metainfo = FunctionMetaInfo(
             name="als_dan",
             return_data_types=[DataType.str],
+            purity=Purity.constant,
             parameters=[
                 ParameterMetaInfo(
                     name="waarde_genereren",
@@ -719,42 +916,22 @@ class Functions:
             ]
         )
 
-        def method(self) -> Any:
+        @classmethod
+        def _condition(cls, parameters: dict) -> bool:
+            try:
+                compare = cls.OPERATORS[parameters["operator"]]
+            except KeyError:
+                raise GeneratorError(error_code=ErrorCode.U0013, msg_args=(parameters["operator"],))
+            return compare(str(parameters["waarde_genereren"]), str(parameters["als_waarde"]))
 
-            if self.operator == "Gelijk aan":
-                if str(self.waarde_genereren) == str(self.als_waarde):
-                    value = str(self.dan_waarde)
-                else:
-                    value = str(self.anders)
-            elif self.operator == "Ongelijk aan":
-                if str(self.waarde_genereren) != str(self.als_waarde):
-                    value = str(self.dan_waarde)
-                else:
-                    value = str(self.anders)
-            elif self.operator == "Kleiner dan":
-                if str(self.waarde_genereren) < str(self.als_waarde):
-                    value = str(self.dan_waarde)
-                else:
-                    value = str(self.anders)
-            elif self.operator == "Kleiner dan of gelijk aan":
-                if str(self.waarde_genereren) <= str(self.als_waarde):
-                    value = str(self.dan_waarde)
-                else:
-                    value = str(self.anders)
-            elif self.operator == "Groter dan":
-                if str(self.waarde_genereren) > str(self.als_waarde):
-                    value = str(self.dan_waarde)
-                else:
-                    value = str(self.anders)
-            elif self.operator == "Groter dan of gelijk aan":
-                if str(self.waarde_genereren) >= str(self.als_waarde):
-                    value = str(self.dan_waarde)
-                else:
-                    value = str(self.anders)
-            else:
-                raise GeneratorError(error_code=ErrorCode.U0013, msg_args=(self.operator,))
+        @classmethod
+        def choose_parameter(cls, parameters: dict) -> str:
+            return "dan_waarde" if cls._condition(parameters) else "anders"
 
-            return value
+        def method(self) -> Any:
+            parameters = {"operator": self.operator, "waarde_genereren": self.waarde_genereren,
+                          "als_waarde": self.als_waarde}
+            return str(self.dan_waarde if self._condition(parameters) else self.anders)
 
     class UploadFile(FunctionBase):
         file_name: str
@@ -763,6 +940,7 @@ class Functions:
         _metainfo = FunctionMetaInfo(
             name="file_uploaden",
             return_data_types=[DataType.str],
+            purity=Purity.constant,
             parameters=[
                 ParameterMetaInfo(
                     name="file_name",
@@ -782,6 +960,8 @@ class Functions:
 
     class RandomIBAN(FunctionBase):
 
+        uses_rng = True
+
         _metainfo = FunctionMetaInfo(
             name="random_IBAN",
             return_data_types=[DataType.str],
@@ -789,55 +969,76 @@ class Functions:
             parameters=[]
         )
 
-        @classmethod
-        def _generate_elfproef_number(cls):
-            while True:
-                number = str(random.randint(1000000000, 9999999999))
-                if sum([int(num) for num in number[::2]]) - sum([int(num) for num in number[1::2]]) == 0:
-                    return number
-
-        @classmethod
-        def _random_mod97(cls):
-            number = random.randint(0, 99999999)
-            control = number % 97
-            if control < 10:
-                control = f"{control:02d}"
-            return control
+        _bank_numbers = {bank_code: int(bank_code.translate(LETTERS)) for bank_code in bank_codes}
+        _country_number = (country_code + "00").translate(LETTERS)
 
         @classmethod
-        def _number_iban(cls, iban):
-            return (iban[4:] + iban[:4]).translate(LETTERS)
+        def _check_digits(cls, bank_number, account_number):
+            """**The IBAN check digits of the account numbers, for ints or NumPy arrays.**
 
-        @classmethod
-        def _generate_iban_check_digits(cls, iban):
-            number_iban = cls._number_iban(iban[:2] + '00' + iban[4:])
-            return '{:0>2}'.format(98 - (int(number_iban) % 97))
+            98 minus the remainder of `<bank code><account number><country code>00` as a number, divided by 97. The
+            remainder is built up per part, so the NumPy integers don't overflow.
+            """
+            remainder = (bank_number % 97 * pow(10, 10, 97) + account_number % 97) % 97
+            remainder = (remainder * pow(10, len(cls._country_number), 97) + int(cls._country_number)) % 97
+            return 98 - remainder
 
         @classmethod
-        def _valid_iban(cls, iban):
-            return int(cls._number_iban(iban)) % 97 == 1
+        def _last_digits(cls, prefixes):
+            """The last digits that make the digit sums on the even and odd positions of the account numbers equal."""
+            difference = 0
+            for position in range(8, -1, -1):
+                prefixes, digits = divmod(prefixes, 10)
+                difference = difference + digits if position % 2 == 0 else difference - digits
+            return difference
 
         @classmethod
-        def _generate_bank_account_number(cls):
-            bank_code = ''.join(random.choices(bank_codes))
-            account_number = cls._generate_elfproef_number()
-            control_number = cls._random_mod97()
-            return f"{country_code}{control_number}{bank_code}{account_number}"
+        def _generate_account_number(cls, rng: random.Random) -> int:
+            while True:
+                prefix = rng.randrange(10 ** 8, 10 ** 9)
+                last_digit = cls._last_digits(prefix)
+                if 0 <= last_digit <= 9:
+                    return prefix * 10 + last_digit
 
         def method(self) -> str:
-            new_code = self._generate_bank_account_number()
-            return new_code if (self._generate_iban_check_digits(new_code) == new_code[2:4]) and self._valid_iban(
-                new_code) else self.method()
-            pass
+            """Draws a bank code and an account number, the check digits are computed instead of searched for."""
+            bank_code = self.rng.choice(bank_codes)
+            account_number = self._generate_account_number(self.rng)
+            check_digits = self._check_digits(self._bank_numbers[bank_code], account_number)
+            return f"{country_code}{check_digits:02d}{bank_code}{account_number}"
+
+        @classmethod
+        def call_column(cls, parameters: dict, rows_amount: int, rng: numpy.random.Generator) -> Optional[list]:
+            bank_numbers = numpy.array([cls._bank_numbers[bank_code] for bank_code in bank_codes])
+            values = []
+            while len(values) < rows_amount:
+                # A bit less than half of the prefixes has a valid last digit.
+                size = (rows_amount - len(values)) * 5 // 2 + 16
+                banks = rng.integers(0, len(bank_codes), size=size)
+                prefixes = rng.integers(10 ** 8, 10 ** 9, size=size)
+                last_digits = cls._last_digits(prefixes)
+                valid = (last_digits >= 0) & (last_digits <= 9)
+                banks = banks[valid]
+                account_numbers = prefixes[valid] * 10 + last_digits[valid]
+                check_digits = cls._check_digits(bank_numbers[banks], account_numbers)
+                values.extend(
+                    f"{country_code}{check:02d}{bank_codes[bank]}{account_number}"
+                    for bank, account_number, check in zip(
+                        banks.tolist(), account_numbers.tolist(), check_digits.tolist()
+                    )
+                )
+            return values[:rows_amount]
 
     class DateDifference(FunctionBase):
         eerste_datum: str
         tweede_datum: str
         weekend_dagen_meenemen: bool
+        feestdagen_meenemen: bool = True
 
         _metainfo = FunctionMetaInfo(
             name="Datumverschil",
             return_data_types=[DataType.int],
+            purity=Purity.constant,
             parameters=[
                 ParameterMetaInfo(
                     name="eerste_datum",
@@ -865,6 +1066,23 @@ class Functions:
                     default_value=False,
                     allow_child_functions=False,
                 ),
+                ParameterMetaInfo(
+                    name="feestdagen_meenemen",
+                    data_types=[DataType.boolean],
+                    values=[
+                        {
+                            "id": "True",
+                            "description": True,
+                        },
+                        {
+                            "id": "False",
+                            "description": False,
+                        },
+                    ],
+                    default_value=True,
+                    optional=True,
+                    allow_child_functions=False,
+                ),
             ]
         )
 
@@ -875,8 +1093,8 @@ class Functions:
 
         def method(self) -> int:
             days_between: int
-            first_date = format_date(self.eerste_datum)
-            second_date = format_date(self.tweede_datum)
+            first_date = parse_date(self.eerste_datum)
+            second_date = parse_date(self.tweede_datum)
             negative_day = self._end_date_later_then_begin_date(first_date, second_date)
             if negative_day:
                 date1 = second_date
@@ -885,17 +1103,24 @@ class Functions:
                 date1 = first_date
                 date2 = second_date
 
-            all_days = (date1 + timedelta(x + 1) for x in range((date2 - date1).days))
-            if not self.weekend_dagen_meenemen:
-                days_between = sum(1 for day in all_days if day.weekday() < 5)
-            else:
-                days_between = sum(1 for day in all_days)
+            # The whole days after the first date, a part of a day (by the time of day) doesn't count.
+            first_day = date1.date() + timedelta(days=1)
+            days_between = int(count_days(first_day, first_day + timedelta(days=(date2 - date1).days),
+                                          self.weekend_dagen_meenemen, self.feestdagen_meenemen))
 
             if negative_day:
                 days_between = -days_between
             return days_between
 
 
+# Dispatch registry from function name to its class, so executing a function doesn't have to scan `Functions`.
+FUNCTIONS: Dict[str, Type[FunctionBase]] = {
+    function_cls._metainfo.name: function_cls
+    for function_cls in vars(Functions).values()
+    if inspect.isclass(function_cls) and issubclass(function_cls, FunctionBase)
+}
+
+
 # if __name__ == "__main__":
 #     EXCLUDED_ATTRS = {
 #         "seed", "seed_instance", "random", "add_provider", "factories", "format", "generator_attrs", "get_arguments",
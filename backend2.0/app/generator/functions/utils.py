@@ -1,11 +1,12 @@
 from __future__ import annotations
 
 import inspect
-from typing import TYPE_CHECKING, Dict, List, Optional, Type, Union, Any
-from datetime import datetime
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Type, Union, Any
 import string
 
 from pydantic import BaseModel, create_model, BaseConfig
+from pydantic.validators import bool_validator, float_validator, int_validator, str_validator
 
 from database.crud import create_method
 from database.database import DatabaseSession
@@ -17,11 +18,16 @@ from generator.schemas.functions import DataType, FunctionMetaInfo, FunctionsMet
 if TYPE_CHECKING:
     from generator.functions.methods import Functions, FunctionBase
 
-DATE_FORMAT = "%Y-%m-%d"
-DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
 LETTERS: dict = {ord(d): str(i) for i, d in enumerate(string.digits + string.ascii_uppercase)}
 bank_codes: list = ['RABO', 'INGB', 'ABNA', 'KNAB']
 country_code: str = "NL"
+# The same coercion pydantic applies to the fields of the `Functions` classes, per `DataType` name.
+DATA_TYPE_COERCERS: Dict[str, Callable[[Any], Any]] = {
+    DataType.str.name: str_validator,
+    DataType.int.name: int_validator,
+    DataType.decimal.name: float_validator,
+    DataType.boolean.name: bool_validator,
+}
 
 
 def compose_functions_metainfo(functions_cls: Type[Functions], methods: List[Method]) -> FunctionsMetaInfo:
@@ -34,7 +40,8 @@ def compose_functions_metainfo(functions_cls: Type[Functions], methods: List[Met
             metainfo: FunctionMetaInfo = attr._metainfo
             metainfo.label = metainfo.name.replace("_", " ").capitalize()
             metainfo.return_data_types = [
-                data_type.name for data_type in metainfo.return_data_types if type(data_type) == DataType
+                data_type.name if type(data_type) == DataType else data_type
+                for data_type in metainfo.return_data_types
             ]
             try:
                 metainfo.method_id = next(method.id for method in methods if method.name == metainfo.name)
@@ -52,19 +59,39 @@ def compose_functions_metainfo(functions_cls: Type[Functions], methods: List[Met
                 # parameter.name = attr.__slots__[index]
                 # parameter.label = parameter.name.replace("_", " ").capitalize()
                 parameter.data_types = [
-                    data_type.name for data_type in parameter.data_types if type(data_type) == DataType
+                    data_type.name if type(data_type) == DataType else data_type
+                    for data_type in parameter.data_types
                 ]
 
             functions_metainfo.functions.append(metainfo)
     return functions_metainfo
 
 
-def format_date(date_str):
-    try:
-        date = datetime.strptime(date_str, DATE_FORMAT)
-    except ValueError:
-        try:
-            date = datetime.strptime(date_str, DATETIME_FORMAT)
-        except ValueError:
-            raise GeneratorError(ErrorCode.U0009, (DATE_FORMAT, DATETIME_FORMAT))
-    return date
+def get_parameter_coercers(function_cls: Type[FunctionBase], metainfo: FunctionMetaInfo) -> Dict[str, Callable]:
+    """**Returns a coercer per parameter, resolved from the data types of the parameter metainfo.**
+
+    The coercers raise a TypeError or ValueError for invalid values, just like pydantic would have raised a
+    ValidationError. Parameters that are allowed to be None in the function class keep None as value.
+    """
+    coercers = {}
+    for parameter in metainfo.parameters:
+        model_field = function_cls.__fields__.get(parameter.name)
+        if model_field is None or not parameter.data_types:
+            continue
+        data_type = parameter.data_types[0]
+        coercer = DATA_TYPE_COERCERS.get(data_type.name if isinstance(data_type, DataType) else data_type)
+        if coercer is None:
+            continue
+        if model_field.allow_none:
+            coercer = _allow_none(coercer)
+        coercers[parameter.name] = coercer
+    return coercers
+
+
+def _coerce_allowing_none(coercer: Callable[[Any], Any], value: Any) -> Any:
+    return None if value is None else coercer(value)
+
+
+def _allow_none(coercer: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """The coercer that keeps None, a partial instead of a closure so compiled plans can be pickled for shards."""
+    return partial(_coerce_allowing_none, coercer)
@@ -0,0 +1,52 @@
+from typing import Dict, Iterator, List, Optional
+
+from errors import GeneratorError, ErrorCode
+from generator.schemas import input
+
+HIERARCHY_SEPARATOR = "->"
+
+
+def parent_hierarchy(hierarchy: str) -> Optional[str]:
+    """The hierarchy of the parent connector, `None` for a root connector."""
+    if HIERARCHY_SEPARATOR not in hierarchy:
+        return None
+    return hierarchy.rsplit(HIERARCHY_SEPARATOR, 1)[0].strip()
+
+
+class ConnectorTree:
+    """**The connectors of the configurations as a tree, built once per run.**
+
+    Maps the hierarchy of every connector to its direct sub-connectors, in the order of the configurations. Finding the
+    sub-connectors of a row then is a dict lookup, instead of comparing the hierarchy strings of all connectors.
+    """
+
+    def __init__(self, connectors: List[input.Connector]):
+        self._connectors: Dict[str, input.Connector] = {connector.hierarchy: connector for connector in connectors}
+        self._sub_connectors: Dict[str, List[input.Connector]] = {hierarchy: [] for hierarchy in self._connectors}
+        self.roots: List[input.Connector] = []
+        for connector in connectors:
+            parent = parent_hierarchy(connector.hierarchy)
+            if parent in self._sub_connectors:
+                self._sub_connectors[parent].append(connector)
+            else:
+                self.roots.append(connector)
+
+    def __contains__(self, hierarchy: str) -> bool:
+        return hierarchy in self._connectors
+
+    def get(self, hierarchy: str) -> input.Connector:
+        try:
+            return self._connectors[hierarchy]
+        except KeyError:
+            raise GeneratorError(ErrorCode.B0005)
+
+    def sub_connectors(self, hierarchy: str) -> List[input.Connector]:
+        return self._sub_connectors.get(hierarchy, [])
+
+    def walk(self) -> Iterator[input.Connector]:
+        """Yields all connectors, every connector before its sub-connectors."""
+        stack = list(reversed(self.roots))
+        while stack:
+            connector = stack.pop()
+            yield connector
+            stack.extend(reversed(self._sub_connectors[connector.hierarchy]))
@@ -0,0 +1,143 @@
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Iterator, List, Set, Tuple
+
+import orjson
+
+from errors import GeneratorError, ErrorCode
+from generator.hierarchy import ConnectorTree, parent_hierarchy
+from generator.schemas import input
+
+PLAN_CACHE_SIZE = 128
+
+# A field of a connector, as (hierarchy, field code).
+FieldNode = Tuple[str, str]
+# The fields of every connector in generation order, by hierarchy.
+FieldOrder = Dict[str, Tuple[str, ...]]
+
+_plan_cache: "OrderedDict[str, FieldOrder]" = OrderedDict()
+_plan_cache_lock = threading.Lock()
+
+
+def configuration_hash(connectors: List[input.Connector]) -> str:
+    """Hashes the parts of the configurations that the field order depends on."""
+    description = [
+        [
+            connector.hierarchy,
+            [
+                [
+                    field.field_code,
+                    [
+                        [function.method_id, [[parameter.name, parameter.input] for parameter in function.parameters]]
+                        for function in field.functions
+                    ],
+                ]
+                for field in connector.fields_
+            ],
+        ]
+        for connector in connectors
+    ]
+    return hashlib.sha256(orjson.dumps(description)).hexdigest()
+
+
+def field_dependencies(field: input.Field) -> Iterator[Tuple[str, FieldNode]]:
+    """Yields the fields a field depends on, with the name of the function that uses them."""
+    for function in field.functions:
+        if function.metainfo is None:
+            continue
+        parameters = {parameter.name: parameter.input for parameter in function.parameters}
+        if function.metainfo.name == "veld_waarde":
+            if "connector" in parameters and "field_id" in parameters:
+                yield function.metainfo.name, (parameters["connector"], parameters["field_id"])
+        elif function.metainfo.name == "bron_waarde_met_vaste_waarde":
+            connector, _, field_code = parameters.get("fixed_value", "").partition("##")
+            if connector and field_code:
+                yield function.metainfo.name, (connector, field_code)
+
+
+def _ancestors(hierarchy: str) -> Set[str]:
+    ancestors = set()
+    while hierarchy is not None:
+        ancestors.add(hierarchy)
+        hierarchy = parent_hierarchy(hierarchy)
+    return ancestors
+
+
+def _cycle_labels(remaining: Set[FieldNode], dependents: Dict[FieldNode, List[FieldNode]],
+                  labels: Dict[FieldNode, str]) -> List[str]:
+    """The labels of the fields on a cycle, without the fields that only depend on a cycle."""
+    on_cycle = set(remaining)
+    changed = True
+    while changed:
+        changed = False
+        for node in list(on_cycle):
+            if not any(dependent in on_cycle for dependent in dependents[node]):
+                on_cycle.remove(node)
+                changed = True
+    return sorted(labels[node] for node in on_cycle)
+
+
+def _plan_field_order(connector_tree: ConnectorTree) -> FieldOrder:
+    labels: Dict[FieldNode, str] = {}
+    dependents: Dict[FieldNode, List[FieldNode]] = {}
+    in_degree: Dict[FieldNode, int] = {}
+    for connector in connector_tree.walk():
+        for field in connector.fields_:
+            node = (connector.hierarchy, field.field_code)
+            labels[node] = field.metainfo.label if field.metainfo else field.field_code
+            dependents[node] = []
+            in_degree[node] = 0
+
+    for connector in connector_tree.walk():
+        ancestors = _ancestors(connector.hierarchy)
+        for field in connector.fields_:
+            node = (connector.hierarchy, field.field_code)
+            for function_name, dependency in field_dependencies(field):
+                if dependency[0] not in connector_tree:
+                    raise GeneratorError(error_code=ErrorCode.U0021, msg_args=dependency)
+                if dependency == node and function_name == "bron_waarde_met_vaste_waarde":
+                    continue  # Gets reported when generating, with a specific error.
+                if dependency[0] not in ancestors or dependency not in in_degree:
+                    continue  # Can't be generated before this field, gets reported when generating.
+                dependents[dependency].append(node)
+                in_degree[node] += 1
+
+    # Kahn's algorithm, fields without dependencies keep the order of the configurations.
+    field_order: Dict[str, List[str]] = {connector.hierarchy: [] for connector in connector_tree.walk()}
+    queue = deque(node for node, degree in in_degree.items() if not degree)
+    while queue:
+        node = queue.popleft()
+        field_order[node[0]].append(node[1])
+        for dependent in dependents[node]:
+            in_degree[dependent] -= 1
+            if not in_degree[dependent]:
+                queue.append(dependent)
+
+    remaining = {node for node, degree in in_degree.items() if degree}
+    if remaining:
+        raise GeneratorError(ErrorCode.U0008, (", ".join(_cycle_labels(remaining, dependents, labels)),))
+    return {hierarchy: tuple(field_codes) for hierarchy, field_codes in field_order.items()}
+
+
+def plan_field_order(connector_tree: ConnectorTree, connectors: List[input.Connector]) -> FieldOrder:
+    """**Orders the fields of all connectors, so every field comes after the fields it depends on.**
+
+    The dependencies of the 'veld_waarde' and 'bron_waarde_met_vaste_waarde' (`connector##field`) functions form one
+    graph over the fields of all connectors, a field can depend on the fields of its own connector and of the
+    connectors above it. The graph gets sorted in linear time, a cycle is reported with the labels of its fields.
+
+    The order is cached by the hash of the configurations, so previewing the same dashboard again skips the planning.
+    """
+    key = configuration_hash(connectors)
+    with _plan_cache_lock:
+        if key in _plan_cache:
+            _plan_cache.move_to_end(key)
+            return _plan_cache[key]
+
+    field_order = _plan_field_order(connector_tree)
+    with _plan_cache_lock:
+        _plan_cache[key] = field_order
+        if len(_plan_cache) > PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+    return field_order
@@ -11,18 +11,17 @@ from database.crud import (
 )
 from database.database import DatabaseSession
 from database.models import Template
-from errors import GeneratorError, ProfitError, ErrorCode
+from errors import GeneratorError, ErrorCode
 from generator.functions.methods import Functions
 from generator.functions.utils import compose_functions_metainfo
+from generator.hierarchy import ConnectorTree
 from generator.schemas.functions import FunctionsMetaInfo
 from generator.schemas.input import ConfigurationDashboard, Source
 from generator.utils import attr_find, attr_find_get
 from generator.variables import Variables
 from profit import connections
 from profit.schemas import UpdateConnectorMetainfo
-
-PROFIT_GET_SKIP = 0
-PROFIT_GET_TAKE = 2000
+from profit.utils import FieldIndex, fields_by_connector
 
 
 class Fuel:
@@ -30,6 +29,8 @@ class Fuel:
     variables: Variables
     functions_metainfo: FunctionsMetaInfo
     metainfo: UpdateConnectorMetainfo
+    fields_by_connector: FieldIndex
+    connector_tree: ConnectorTree
 
     def __init__(self, db: DatabaseSession, template_id: int, process_id: int, configurations: ConfigurationDashboard):
         self._db = db
@@ -55,23 +56,20 @@ class Fuel:
         )
         self.metainfo = UpdateConnectorMetainfo.parse_obj(response)
         self.raw_metainfo = response
+        self.fields_by_connector = fields_by_connector(response)
 
     async def _get_source_data(self, source: Source):
         if source.type_source == "GetConnector":
             get_connector = source.get_connector.name
             if get_connector not in self.source_data:
-                params = {"skip": PROFIT_GET_SKIP, "take": PROFIT_GET_TAKE}
-                get_connector_data = await connections.get_connector_data(
-                    self.template.profit_endpoint, self.template.token, get_connector, params
+                self.source_data[get_connector] = await connections.get_connector_rows(
+                    self.template.profit_endpoint, self.template.token, get_connector,
+                    page_size=source.get_connector.page_size or connections.PAGE_SIZE,
+                    max_rows=source.get_connector.max_rows or connections.MAX_ROWS,
+                )
+                self.source_metainfo[get_connector] = await connections.get_connector_metainfo(
+                    self.template.profit_endpoint, self.template.token, get_connector
                 )
-                try:
-                    self.source_data[get_connector] = get_connector_data["rows"]
-                    self.source_metainfo[get_connector] = await connections.get_connector_metainfo(
-                        self.template.profit_endpoint, self.template.token, get_connector
-                    )
-                except KeyError:
-                    logger.info(get_connector)
-                    raise ProfitError(error_code=ErrorCode.P0013, msg_args=(get_connector,))
 
             source.name = get_connector
         elif source.type_source == "csv":
@@ -99,13 +97,13 @@ class Fuel:
                 await self._get_source_data(data_source.filter_source.source)
 
     async def _attach_data(self):
-        for connector in self.configurations.connectors:
-            connector.metainfo = attr_find(
-                iterable=self.metainfo.connectors,
-                find_attr="hierarchy",
-                find_value=connector.hierarchy,
-                error=GeneratorError(ErrorCode.B0005)
-            )
+        self.connector_tree = ConnectorTree(self.configurations.connectors)
+        connectors_metainfo = {connector.hierarchy: connector for connector in self.metainfo.connectors}
+        for connector in self.connector_tree.walk():
+            try:
+                connector.metainfo = connectors_metainfo[connector.hierarchy]
+            except KeyError:
+                raise GeneratorError(ErrorCode.B0005)
             for field in connector.fields_:
                 field.metainfo = attr_find(
                     iterable=connector.metainfo.fields_,
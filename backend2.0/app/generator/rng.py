@@ -0,0 +1,22 @@
+import random
+from typing import Optional
+
+import numpy
+
+
+class RandomStreams:
+    """**The random number generators of a run, all derived from the seed of the run.**
+
+    Every stream is keyed by the place where it gets used, for example the hierarchy of a connector and the indices of
+    a row and its parent rows. The same seed then generates the same data, whether the rows are generated in order or
+    in shards by separate processes.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self.seed = random.getrandbits(64) if seed is None else seed
+
+    def stream(self, *key) -> random.Random:
+        return random.Random("/".join(str(part) for part in (self.seed, *key)))
+
+    def numpy_stream(self, *key) -> numpy.random.Generator:
+        return numpy.random.default_rng(self.stream(*key).getrandbits(64))
@@ -13,6 +13,13 @@ class DataType(Enum):
     boolean = bool
 
 
+class Purity(str, Enum):
+    """What the value of a function depends on, used to optimise the function trees of a run."""
+    constant = "constant"  # Only on its parameters, gets evaluated once per run when those are constant too.
+    row = "row"  # On the row as well (sources or generated fields), gets evaluated once per row.
+    random = "random"  # Differs on every call.
+
+
 ANY = (DataType.str, DataType.int, DataType.decimal, DataType.boolean)
 
 
@@ -48,6 +55,7 @@ class FunctionMetaInfo(BaseModel):
     method_id: PositiveInt = None
     label: str = None
     horizontal_parameters: bool = False
+    purity: Purity = Purity.random
     parameters: List[ParameterMetaInfo]
 
     @property
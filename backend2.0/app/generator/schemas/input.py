@@ -1,6 +1,6 @@
 from typing import Literal, List, Optional, Union
 
-from pydantic import BaseModel, Field as SchemaField
+from pydantic import BaseModel, Field as SchemaField, PositiveInt
 
 from generator.schemas.functions import FunctionMetaInfo
 from profit.schemas import ConnectorMetainfo, UpdateConnectorField
@@ -17,6 +17,8 @@ class ProcessSettings(BaseSchema):
 
 class GetConnector(BaseSchema):
     name: str
+    page_size: Optional[PositiveInt]  # Rows per request to Profit, `connections.PAGE_SIZE` when left out.
+    max_rows: Optional[PositiveInt]  # Rows that get fetched at most, `connections.MAX_ROWS` when left out.
 
 
 class CSVFile(BaseSchema):
@@ -91,6 +93,7 @@ class Field(BaseSchema):
     inherit: bool
     functions: List[Function]
     custom_row_values: List[CustomRowValue] = []
+    unique: bool = False  # Every row of the run gets a different value, for primary keys.
 
     metainfo: Optional[UpdateConnectorField]  # Gets set in `Fuel._attach_data()`
 
@@ -109,3 +112,4 @@ class ConfigurationDashboard(BaseSchema):
     process_settings: ProcessSettings
     data_sources: List[DataSource]
     connectors: List[Connector]
+    seed: Optional[int]  # Generates the same data again, a random seed gets chosen when it is left out.
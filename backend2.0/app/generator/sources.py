@@ -0,0 +1,240 @@
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from errors import GeneratorError, ErrorCode
+from generator.rng import RandomStreams
+
+# The (source, field, value, connector run) combinations of which the order of the rows is kept.
+RUN_ORDERS_SIZE = 4096
+
+
+class SourceSampler:
+    """**Random row access into a source, without copying or enlarging its rows.**
+
+    The row indices of the source are shuffled into a compact `array('I')` permutation. A repeatable source repeats
+    its rows with a new shuffle for every repetition, the permutation of a repetition only gets created when it is
+    read. A source that isn't repeatable keeps cycling through its single permutation. A run that needs more rows than
+    a repeatable source has reads them in the order of `repeated_order` instead.
+    """
+
+    def __init__(self, rows: list, repeatable: bool, random_streams: RandomStreams, key: Tuple[str, str]):
+        self.rows = rows
+        self.repeatable = repeatable
+        self._random_streams = random_streams
+        self._key = key
+        self._permutations: Dict[int, array] = {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _permutation(self, repetition: int) -> array:
+        try:
+            return self._permutations[repetition]
+        except KeyError:
+            permutation = array("I", range(len(self.rows)))
+            self._random_streams.stream("source", *self._key, repetition).shuffle(permutation)
+            self._permutations[repetition] = permutation
+            return permutation
+
+    def __getitem__(self, position: int) -> dict:
+        length = len(self.rows)
+        if position < 0 or length == 0:
+            raise IndexError(position)
+        repetition, index = divmod(position, length)
+        return self.rows[self._permutation(repetition if self.repeatable else 0)[index]]
+
+    def repeated_order(self, position: int, rows_amount: int) -> array:
+        """**The order of the rows of a run that needs more rows than the source has, starting at a position.**
+
+        The rows are repeated as often as the run needs and shuffled together, like one list of the repeated rows, so
+        a row can come back anywhere in the run instead of once per repetition. The order holds the indices into the
+        repeated rows, the row of an index is the index modulo the amount of rows.
+        """
+        repetitions = -(-rows_amount // len(self.rows))
+        order = array("I", range(len(self.rows) * repetitions))
+        self._random_streams.stream("source", *self._key, "run", position).shuffle(order)
+        return order
+
+    def prepare(self, position: int):
+        """Creates the permutations of all repetitions up to a position, so forked processes share them."""
+        if self.repeatable and self.rows:
+            for repetition in range((position - 1) // len(self) + 1):
+                self._permutation(repetition)
+        elif self.rows:
+            self._permutation(0)
+
+    def release(self, position: int):
+        """Drops the permutations of the repetitions before a position, those will never be read again."""
+        if self.repeatable and self.rows:
+            for repetition in [repetition for repetition in self._permutations if repetition < position // len(self)]:
+                del self._permutations[repetition]
+
+
+class SourceView:
+    """The rows of a source as one connector run sees them, read through the sampler of its cursor."""
+    __slots__ = ("_sampler", "_offset", "_rows_amount", "_repeated", "_order")
+
+    def __init__(self, sampler: SourceSampler, offset: int, rows_amount: int):
+        self._sampler = sampler
+        self._offset = offset
+        self._rows_amount = rows_amount
+        self._repeated = sampler.repeatable and rows_amount > len(sampler) > 0
+        self._order: Optional[array] = None
+
+    def __len__(self) -> int:
+        return len(self._sampler)
+
+    def _repeated_order(self) -> array:
+        if self._order is None:
+            self._order = self._sampler.repeated_order(self._offset, self._rows_amount)
+        return self._order
+
+    def __getitem__(self, index: int) -> dict:
+        if index < 0 or (index >= len(self._sampler) and not self._sampler.repeatable):
+            raise IndexError(index)
+        if self._repeated and index < self._rows_amount:
+            return self._sampler.rows[self._repeated_order()[index] % len(self._sampler)]
+        return self._sampler[self._offset + index]
+
+    def prepare(self, rows_amount: int):
+        if self._repeated:
+            self._repeated_order()
+        self._sampler.prepare(self._offset + rows_amount)
+
+    def __iter__(self) -> Iterator[dict]:
+        for index in range(len(self)):
+            yield self[index]
+
+
+class SourceCursor:
+    """**The sampler of a source for one connector, with the offset where its next run starts.**
+
+    Every run of the connector continues at the offset where its previous run stopped, so sub-connectors that run once
+    per parent row don't reshuffle the source.
+    """
+
+    def __init__(self, rows: list, repeatable: bool, random_streams: RandomStreams, key: Tuple[str, str]):
+        self._sampler = SourceSampler(rows, repeatable, random_streams, key)
+        self._offset = 0
+
+    def advance(self, rows_amount: int) -> SourceView:
+        self._sampler.release(self._offset)
+        view = SourceView(self._sampler, self._offset, rows_amount)
+        self._offset += rows_amount
+        if not self._sampler.repeatable and len(self._sampler):
+            self._offset %= len(self._sampler)
+        return view
+
+    def seek(self, position: int):
+        """Moves to the position where the next run starts, as if runs with that amount of rows came before."""
+        self._offset = position
+        if not self._sampler.repeatable and len(self._sampler):
+            self._offset %= len(self._sampler)
+
+
+class SourceCursors:
+    """**The cursors into the sources of a run, one per (connector, source).**
+
+    The sampler of a cursor is created the first time the connector uses the source, after that the runs of the
+    connector only advance the offset of the cursor.
+    """
+
+    def __init__(self, source_data: Dict[str, list], repeatable: Dict[str, bool], random_streams: RandomStreams):
+        self._source_data = source_data
+        self._repeatable = repeatable
+        self._random_streams = random_streams
+        self._connector_sources: Dict[str, List[str]] = {}
+        self._cursors: Dict[Tuple[str, str], SourceCursor] = {}
+
+    def register(self, hierarchy: str, source_names: Iterable[str]):
+        """Registers the sources that are used by the functions of a connector."""
+        self._connector_sources[hierarchy] = [
+            source_name for source_name in dict.fromkeys(source_names) if source_name in self._source_data
+        ]
+
+    def _cursor(self, hierarchy: str, source_name: str) -> SourceCursor:
+        key = (hierarchy, source_name)
+        try:
+            return self._cursors[key]
+        except KeyError:
+            cursor = self._cursors[key] = SourceCursor(
+                self._source_data[source_name], self._repeatable.get(source_name, False), self._random_streams, key
+            )
+            return cursor
+
+    def advance(self, hierarchy: str, rows_amount: int) -> Dict[str, SourceView]:
+        """Returns the views on the sources for the next run of a connector with the given amount of rows."""
+        return {
+            source_name: self._cursor(hierarchy, source_name).advance(rows_amount)
+            for source_name in self._connector_sources.get(hierarchy, ())
+        }
+
+    def seek(self, hierarchy: str, position: int):
+        """Moves the cursors of a connector past the given amount of rows of its earlier runs."""
+        for source_name in self._connector_sources.get(hierarchy, ()):
+            self._cursor(hierarchy, source_name).seek(position)
+
+
+class SourceIndex:
+    """**Lazy hash index on the rows of the sources.**
+
+    An index on a (source, field) combination gets built the first time the field is used as a key, after that it is
+    shared by all rows and sub-connectors of the run. Looking up the rows of a source that have a certain value then
+    costs O(1) instead of a scan over the whole source.
+
+    Every connector run sees the rows of a value in its own random order, like the shuffle of the source per run did.
+    The orders of the last `RUN_ORDERS_SIZE` lookups are kept, the rows of a run all use the same one.
+    """
+
+    def __init__(self, source_data: Dict[str, list], random_streams: RandomStreams):
+        self._source_data = source_data
+        self._random_streams = random_streams
+        self._indexes: Dict[Tuple[str, str], Dict[Any, List[dict]]] = {}
+        self._run_orders: "OrderedDict[tuple, List[dict]]" = OrderedDict()
+
+    def _build(self, source_name: str, field: str) -> Dict[Any, List[dict]]:
+        try:
+            rows = self._source_data[source_name]
+        except KeyError:
+            raise GeneratorError(error_code=ErrorCode.U0017, msg_args=(source_name,))
+        index: Dict[Any, List[dict]] = {}
+        for row in rows:
+            try:
+                value = row[field]
+            except KeyError:
+                raise GeneratorError(error_code=ErrorCode.U0022, msg_args=(field, source_name))
+            try:
+                index.setdefault(value, []).append(row)
+            except TypeError:  # Unhashable values can never be equal to a hashable fixed value.
+                pass
+        return index
+
+    def _rows(self, source_name: str, field: str, value: Any) -> List[dict]:
+        key = (source_name, field)
+        try:
+            index = self._indexes[key]
+        except KeyError:
+            index = self._indexes[key] = self._build(source_name, field)
+        try:
+            return index.get(value, [])
+        except TypeError:
+            return [row for row in self._source_data[source_name] if row[field] == value]
+
+    def lookup(self, source_name: str, field: str, value: Any, run_key: tuple = ()) -> List[dict]:
+        """Returns the rows of the source where the field is equal to the value, in the order of the run."""
+        rows = self._rows(source_name, field, value)
+        if len(rows) < 2:
+            return rows
+        key = (source_name, field, repr(value), run_key)
+        try:
+            self._run_orders.move_to_end(key)
+            return self._run_orders[key]
+        except KeyError:
+            pass
+        rows = list(rows)
+        self._random_streams.stream("index", *key).shuffle(rows)
+        self._run_orders[key] = rows
+        if len(self._run_orders) > RUN_ORDERS_SIZE:
+            self._run_orders.popitem(last=False)
+        return rows
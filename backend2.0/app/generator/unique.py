@@ -0,0 +1,106 @@
+import random
+from array import array
+from typing import Any, Callable, Optional, Sequence, Set
+
+from errors import GeneratorError, ErrorCode
+
+# Up to this domain size a permutation gets shuffled in memory, larger domains use a Feistel network.
+SHUFFLE_LIMIT = 1 << 20
+# The number of times a function without a domain gets called for a value that hasn't been generated yet.
+MAX_UNIQUE_ATTEMPTS = 1000
+FEISTEL_ROUNDS = 4
+_MASK_64 = (1 << 64) - 1
+
+
+class ShuffledRange:
+    """A random permutation of `range(size)`, shuffled into a compact array."""
+
+    def __init__(self, size: int, rng: random.Random):
+        self._permutation = array("I", range(size))
+        rng.shuffle(self._permutation)
+
+    def __getitem__(self, index: int) -> int:
+        return self._permutation[index]
+
+
+class FeistelPermutation:
+    """**A random permutation of `range(size)` for domains too large to shuffle, computed per index.**
+
+    A balanced Feistel network is a bijection on the integers of an even number of bits, whatever its round function.
+    Indices that land outside the range get encrypted again (cycle walking), the smallest power of 4 above the size
+    keeps that under 4 rounds on average.
+    """
+
+    def __init__(self, size: int, rng: random.Random):
+        self._size = size
+        self._half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+        self._half_mask = (1 << self._half_bits) - 1
+        self._keys = [rng.getrandbits(64) for _ in range(FEISTEL_ROUNDS)]
+
+    def _round(self, half: int, key: int) -> int:
+        mixed = ((half ^ key) * 0x9E3779B97F4A7C15) & _MASK_64
+        return (mixed ^ (mixed >> 29)) & self._half_mask
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self._half_bits, value & self._half_mask
+        for key in self._keys:
+            left, right = right, left ^ self._round(right, key)
+        return (left << self._half_bits) | right
+
+    def __getitem__(self, index: int) -> int:
+        value = self._encrypt(index)
+        while value >= self._size:
+            value = self._encrypt(value)
+        return value
+
+
+class UniqueValues:
+    """**Makes the values of a field different for every row of a run.**
+
+    If the function of the field can list its values (`FunctionBase.unique_domain`), the n-th row of the run gets the
+    n-th value of a random permutation of that domain, so no value has to be generated twice. A run that needs more
+    rows than the domain has values fails before generating. For other functions the generated values are kept in a
+    set, and the function is called again for a value that was already generated.
+
+    Every run of the connector continues at the position where its previous run stopped, like `SourceCursor`.
+    """
+
+    def __init__(self, field_label: str, domain: Optional[Sequence], rng: random.Random):
+        self._field_label = field_label
+        self._domain = domain
+        self._permutation = None
+        if domain is not None:
+            permutation_cls = ShuffledRange if len(domain) <= SHUFFLE_LIMIT else FeistelPermutation
+            self._permutation = permutation_cls(len(domain), rng)
+        self._generated: Set[Any] = set()
+        self._offset = 0
+
+    @property
+    def shardable(self) -> bool:
+        """Whether the values only depend on the position of the row, so the rows can be generated in shards."""
+        return self._domain is not None
+
+    def advance(self, rows_amount: int) -> int:
+        """Returns the position of the first row of the next run of the connector, fails if the domain is too small."""
+        offset = self._offset
+        self._offset += rows_amount
+        if self._domain is not None and self._offset > len(self._domain):
+            raise GeneratorError(error_code=ErrorCode.U0032,
+                                 msg_args=(self._field_label, len(self._domain), self._offset))
+        return offset
+
+    def seek(self, position: int):
+        """Moves to the position where the next run of the connector starts, for the first run of a shard."""
+        self._offset = position
+
+    def value(self, position: int, generate: Callable[[], Any]) -> Any:
+        if self._domain is not None:
+            return self._domain[self._permutation[position]]
+        for _ in range(MAX_UNIQUE_ATTEMPTS):
+            value = generate()
+            if value == "##DELETE":
+                return value
+            if value not in self._generated:
+                self._generated.add(value)
+                return value
+        raise GeneratorError(error_code=ErrorCode.U0033, msg_args=(self._field_label, MAX_UNIQUE_ATTEMPTS))
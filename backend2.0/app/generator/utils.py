@@ -78,74 +78,3 @@ def find_values(filter_field, filter_source, raw_source_data, all_data):
             filter_values = set(row[filter_field] for row in values)
     source_data = [row for row in raw_source_data if row[filter_field] not in filter_values]
     return source_data
-
-
-def remove_empty_rows(data):
-    if type(data["item"]) == list:
-        raise RocketError(ErrorCode.B0015)
-    else:
-        for update_connector, element in data["item"].items():
-            if type(element["Element"]) == list:
-                new_elements = []
-                for new_element in element["Element"]:
-                    for name, value in new_element.items():
-                        if name == "Fields":
-                            all_values = value.values()
-                            if "##DELETE" in all_values and data["row_removed"] is not True:
-                                data["row_removed"] = True
-                            if "##DELETE" not in all_values:
-                                new_elements.append(new_element)
-                        elif name == "Objects" and len(value) != 0:
-                            if type(value) == list:
-                                result = remove_list_items(
-                                    {
-                                        "row_removed": data["row_removed"],
-                                        "item": value
-                                    }
-                                )
-                                if result["row_removed"]:
-                                    data["row_removed"] = True
-                                new_element["Objects"] = result["item"]
-                element["Element"] = new_elements
-
-            else:
-                for name, item in element["Element"].items():
-                    if name == "Fields":
-                        item_values = item.values()
-                        if "##DELETE" in item_values:
-                            data["row_removed"] = True
-                            data["item"] = None
-                            return data
-
-                    elif name == "Objects" and len(item) != 0:
-                        if type(item) == list:
-                            result = remove_list_items(
-                                {
-                                    "row_removed": data["row_removed"],
-                                    "item": item
-                                }
-                            )
-                            if result["row_removed"]:
-                                data["row_removed"] = True
-                            element["Element"]["Objects"] = result["item"]
-
-    return data
-
-
-def remove_list_items(data):
-    all_items = []
-    for item in data["item"]:
-        new_item = remove_empty_rows(
-            {
-                "row_removed": data["row_removed"],
-                "item": item
-            })
-        if new_item["item"] is None and data["row_removed"] is not True:
-            data["row_removed"] = True
-        elif new_item["row_removed"]:
-            data["row_removed"] = True
-
-        if new_item["item"] is not None:
-            all_items.append(new_item["item"])
-    data["items"] = all_items
-    return data
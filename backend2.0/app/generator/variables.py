@@ -1,4 +1,7 @@
-from typing import List
+import re
+from functools import lru_cache
+from types import MappingProxyType
+from typing import List, Mapping
 from datetime import timedelta, datetime
 from calendar import monthrange
 
@@ -10,6 +13,10 @@ from generator.utils import get_year
 date_format = "%Y-%m-%d"
 datetime_format = "%Y-%m-%dT%H:%M:%SZ"
 
+APPLY_CACHE_SIZE = 1024
+# The number of times the values of variables get expanded in turn, a variable may hold another `$name`.
+EXPANSION_DEPTH = 10
+
 
 def first_day_of_the_month(date):
     return datetime.strftime(date.replace(day=1), date_format)
@@ -72,6 +79,7 @@ class Variables:
         self._add_static_vars()
         self._add_dynamic_vars()
         self._combine_vars()
+        self._freeze()
 
     @property
     def variables(self) -> dict:
@@ -129,27 +137,44 @@ class Variables:
         }
         return self.dynamic_variables
 
+    def _freeze(self):
+        """**Resolves the variables once, for all strings of the run.**
+
+        The names are compiled into one regex alternation, longest name first, so `$jaar_volgende_maand` isn't
+        replaced as `$jaar`. Constant strings repeat on every row, so the expanded strings are kept in an LRU cache.
+        """
+        self.frozen_variables: Mapping[str, str] = MappingProxyType(self.variables)
+        names = sorted(self.frozen_variables, key=len, reverse=True)
+        self._pattern = re.compile(r"\$(" + "|".join(re.escape(name) for name in names) + ")") if names else None
+        self._apply = lru_cache(maxsize=APPLY_CACHE_SIZE)(self._substitute)
+
+    def __getstate__(self) -> dict:
+        state = dict(self.__dict__)
+        state["frozen_variables"] = dict(self.frozen_variables)
+        del state["_apply"]
+        return state
+
+    def __setstate__(self, state: dict):
+        """Freezes the variables again after unpickling, in the processes of a sharded run."""
+        self.__dict__.update(state)
+        self.frozen_variables = MappingProxyType(self.frozen_variables)
+        self._apply = lru_cache(maxsize=APPLY_CACHE_SIZE)(self._substitute)
+
+    def _substitute(self, string: str) -> str:
+        """Replaces the variables until none are left, up to `EXPANSION_DEPTH` times for variables in variables."""
+        if self._pattern is None:
+            return string
+        for _ in range(EXPANSION_DEPTH):
+            expanded = self._pattern.sub(lambda match: self.frozen_variables[match.group(1)], string)
+            if expanded == string:
+                break
+            string = expanded
+        return string
+
     def apply(self, string: str) -> str:
-        old_string = string.rsplit(' ')
-        for index, item in enumerate(old_string):
-            if "$" in item:
-                value = self.get_variable_name(item)
-                if value is not None:
-                    old_string[index] = value
-
-        new_string = " ".join(old_string)
-        return new_string
-
-    def get_variable_name(self, string):
-        new_string = string
-        all_variables = dict(self.variables.items())
-        sorted_vars = {}
-        for k in sorted(all_variables, key=len, reverse=True):
-            sorted_vars[k] = all_variables[k]
-        for var_name, var_value in sorted_vars.items():
-            if var_name in new_string:
-                new_string = new_string.replace("$" + var_name, var_value)
-        return new_string
+        if "$" not in string:
+            return string
+        return self._apply(string)
 
     def create_dynamic_variables(self):
         var_names = []
@@ -3,10 +3,12 @@ import inspect
 import errors
 from database.database import initialize_db
 from exception_handlers import rocket_exception_handler
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import ORJSONResponse, RedirectResponse
-from profit.connections import session_conn
+from generator.core import shutdown_shard_pool
+from profit.limiter import current_flow
+from profit.session import open_session, close_session
 from routers import database, generator, profit, check_profit, template, chapter, entity, variables, sources, sql_batch
 
 app = FastAPI(
@@ -43,15 +45,34 @@ for error in dir(errors):
         app.add_exception_handler(error_type, rocket_exception_handler)
 
 
+@app.middleware("http")
+async def profit_flow(request: Request, call_next):
+    """Makes every request to the API its own flow in the queues of the Profit environments."""
+    token = current_flow.set(object())
+    try:
+        return await call_next(request)
+    finally:
+        current_flow.reset(token)
+
+
 @app.on_event("startup")
 async def db_init() -> None:
     await initialize_db()
 
 
+@app.on_event("startup")
+async def open_http_session() -> None:
+    await open_session()
+
+
 @app.on_event("shutdown")
 async def close_http_session() -> None:
-    session = await session_conn()
-    await session.close()
+    await close_session()
+
+
+@app.on_event("shutdown")
+async def close_shard_pool() -> None:
+    shutdown_shard_pool()
 
 
 @app.get("/api/")
@@ -0,0 +1,95 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from profit.limiter import environment_of
+
+# Seconds a metainfo response of Profit stays valid, metainfo only changes when the App connector changes.
+METAINFO_TTL = float(os.getenv("PROFIT_METAINFO_TTL", default=600))
+METAINFO_CACHE_SIZE = int(os.getenv("PROFIT_METAINFO_CACHE_SIZE", default=1024))
+
+# (environment, token hash, kind of metainfo, connector)
+CacheKey = Tuple[str, str, str, str]
+
+
+def cache_key(endpoint: str, environment_token: str, kind: str, connector: str = "") -> CacheKey:
+    """The key of a response, the token is hashed because it may see other connectors than another token."""
+    token_hash = hashlib.sha256(environment_token.encode()).hexdigest()[:16]
+    return environment_of(endpoint), token_hash, kind, connector
+
+
+class TTLCache:
+    """**An async cache of Profit responses that expire after a time to live.**
+
+    Concurrent misses of a key share one request to Profit (single flight), that request also finishes when the
+    request that started it gets cancelled. Failed requests and Profit error responses are not cached. The least
+    recently used entries make room once the cache is full.
+
+    The cached values are shared by every caller, so they must not be changed.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        self._loading: Dict[CacheKey, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    async def get(self, key: CacheKey, load: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        future = self._loading.get(key)
+        if future is None:
+            self.misses += 1
+            future = self._loading[key] = asyncio.ensure_future(load())
+            future.add_done_callback(partial(self._loaded, key))
+        else:
+            self.shared += 1
+        return await asyncio.shield(future)
+
+    def _loaded(self, key: CacheKey, future: asyncio.Future) -> None:
+        if self._loading.get(key) is not future:  # Invalidated while loading.
+            return
+        del self._loading[key]
+        if future.cancelled() or future.exception() is not None:
+            return
+        value = future.result()
+        if isinstance(value, dict) and "errorNumber" in value:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, endpoint: Optional[str] = None, environment_token: Optional[str] = None,
+                   connector: Optional[str] = None) -> int:
+        """Drops the entries of an environment (and token, and connector), or all entries. Returns how many."""
+        environment, token_hash, _, _ = cache_key(endpoint or "", environment_token or "", "")
+
+        def matches(key: CacheKey) -> bool:
+            return (endpoint is None or key[0] == environment) \
+                and (environment_token is None or key[1] == token_hash) \
+                and (connector is None or key[3] == connector)
+
+        invalidated = [key for key in self._entries if matches(key)]
+        for key in invalidated:
+            del self._entries[key]
+        for key in [key for key in self._loading if matches(key)]:
+            del self._loading[key]
+        return len(invalidated)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "shared": self.shared}
+
+
+METAINFO_CACHE = TTLCache(METAINFO_TTL, METAINFO_CACHE_SIZE)
@@ -1,10 +1,12 @@
 import json
-from typing import Any, Dict, Literal
+import math
+import os
+from functools import partial
+from typing import Any, Awaitable, Dict, Literal, Optional
 import asyncio
 import time
 
 import orjson
-from aiohttp import ClientSession, TCPConnector
 from aiohttp.client_exceptions import (
     ClientConnectionError,  ## Geen bevoegdheid voor hogere tier code.
     ClientConnectorCertificateError,  ## Cetificaat error
@@ -28,17 +30,72 @@ from aiohttp.client_exceptions import (
 from loguru import logger
 
 from errors import ErrorCode, ProfitError, GeneratorError
-from profit.utils import flatten_metainfo, get_token_headers, get_keys, set_primary_keys_right_dict
-
-TCP_LIMIT = 35  # Profit block at limit >= 70 (or less?)
+from profit.cache import METAINFO_CACHE, cache_key
+from profit.limiter import environment_of, get_limiter
+from profit.resilience import RETRY_POLICY, RETRY_STATUSES, ProfitUnavailable, guarded_request
+from profit.rows import RowStore
+from profit.session import get_session
+from profit.utils import fields_by_connector, flatten_metainfo, get_token_headers, get_keys, set_primary_keys_right_dict
+
+# Rows per GetConnector request, and the rows of a GetConnector that get fetched at most.
+PAGE_SIZE = int(os.getenv("PROFIT_PAGE_SIZE", default=2000))
+MAX_ROWS = int(os.getenv("PROFIT_MAX_ROWS", default=1_000_000))
+# Pages of one GetConnector in flight at the same time.
+PAGE_CONCURRENCY = int(os.getenv("PROFIT_PAGE_CONCURRENCY", default=4))
 JSON_ENCODER = orjson.dumps
 JSON_DECODER = orjson.loads
+# The Profit error of every aiohttp exception, the first match counts.
+AIOHTTP_ERRORS = (
+    ((ContentTypeError, ClientResponseError), ErrorCode.P0009),
+    (WSServerHandshakeError, ErrorCode.P0011),
+    (ClientHttpProxyError, ErrorCode.P0007),
+    (ClientConnectorCertificateError, ErrorCode.P0003),
+    (ClientConnectorSSLError, ErrorCode.P0005),
+    ((ClientSSLError, ClientProxyConnectionError, ClientConnectorError), ErrorCode.P0004),
+    ((ServerDisconnectedError, ServerTimeoutError, ServerFingerprintMismatch, ServerConnectionError), ErrorCode.P0011),
+    (ClientOSError, ErrorCode.P0008),
+    (ClientConnectionError, ErrorCode.P0002),
+    (ClientPayloadError, ErrorCode.P0009),
+    (InvalidURL, ErrorCode.P0010),
+    (ClientError, ErrorCode.P0006),
+)
 
 
-async def session_conn():
-    conn = TCPConnector(verify_ssl=False, limit=TCP_LIMIT)
-    session = ClientSession(connector=conn)
-    return session
+def _profit_error(error: Exception) -> Exception:
+    """The Profit error the user gets for a failed request."""
+    if isinstance(error, ProfitUnavailable):
+        error_code = ErrorCode.P0012 if error.status == 429 else ErrorCode.P0011
+        return ProfitError(error_code, profit_msg=error.message, profit_status=error.status,
+                           aiohttp_error=type(error).__name__)
+    if isinstance(error, asyncio.TimeoutError) and not isinstance(error, ClientError):
+        return ProfitError(ErrorCode.P0012, aiohttp_error=type(error).__name__)
+    for error_types, error_code in AIOHTTP_ERRORS:
+        if isinstance(error, error_types):
+            if isinstance(error, ClientResponseError):
+                return ProfitError(error_code, profit_msg=error.message, profit_status=error.status,
+                                   aiohttp_error=type(error).__name__)
+            return ProfitError(error_code, aiohttp_error=type(error).__name__)
+    return error
+
+
+async def _send(method: str, url: str, headers: dict, params: Optional[dict], data: str, **kwargs: Any) -> Any:
+    session = await get_session()
+    async with session.request(method=method, url=url, headers=headers, params=params, data=data, **kwargs) as resp:
+        if resp.status in RETRY_STATUSES:
+            raise ProfitUnavailable(resp.status, await resp.text(), resp.headers.get("Retry-After"))
+        try:
+            response = await resp.json(loads=JSON_DECODER)
+        except ClientError:
+            raise
+        except Exception as e:  # TODO: maybe do specific catching on deserialization
+            raise ProfitError(ErrorCode.P0000, aiohttp_error=type(e).__name__, decode_error=True)
+        lack_off_response = {
+            "response": "Update/Delete went well"
+        }
+        if response is None:
+            response = lack_off_response
+
+        return response
 
 
 async def profit_request(
@@ -50,74 +107,25 @@ async def profit_request(
         data: Dict[str, Any] = None,
         **kwargs: Dict[str, Any],
 ) -> Any:
+    """**Sends a request to Profit, and sends it again when it failed transiently and may be retried.**
+
+    See `RetryPolicy` for the requests that get retried. Every attempt goes through the breaker and the limiter of the
+    environment (`guarded_request`).
+    """
     headers = get_token_headers(environment_token)
-    session = await session_conn()
-    try:  # TODO: Error handling
-        async with session.request(method=method, url=url, headers=headers, params=params, data=json.dumps(data),
-                                   **kwargs) as resp:
-            try:
-                response = await resp.json(loads=JSON_DECODER)
-                lack_off_response = {
-                    "response": "Update/Delete went well"
-                }
-                if response is None:
-                    response = lack_off_response
-
-                return response
-            except (ContentTypeError, ClientResponseError) as e:
-                raise ProfitError(ErrorCode.P0009, profit_msg=e.message, profit_status=e.status,
-                                  aiohttp_error=type(e).__name__)
-            except WSServerHandshakeError as e:
-                raise ProfitError(ErrorCode.P0011, profit_msg=e.message, profit_status=e.status,
-                                  aiohttp_error=type(e).__name__)
-            except ClientHttpProxyError as e:
-                raise ProfitError(ErrorCode.P0007, profit_msg=e.message, profit_status=e.status,
-                                  aiohttp_error=type(e).__name__)
-            except ClientConnectorCertificateError as e:
-                raise ProfitError(ErrorCode.P0003, aiohttp_error=type(e).__name__)
-            except ClientConnectorSSLError as e:
-                raise ProfitError(ErrorCode.P0005, aiohttp_error=type(e).__name__)
-            except (ClientSSLError, ClientProxyConnectionError, ClientConnectorError) as e:
-                raise ProfitError(ErrorCode.P0004, aiohttp_error=type(e).__name__)
-            except (ServerDisconnectedError, ServerTimeoutError, ServerFingerprintMismatch, ServerConnectionError) as e:
-                raise ProfitError(ErrorCode.P0011, aiohttp_error=type(e).__name__)
-            except ClientOSError as e:
-                raise ProfitError(ErrorCode.P0008, aiohttp_error=type(e).__name__)
-            except ClientConnectionError as e:
-                raise ProfitError(ErrorCode.P0002, aiohttp_error=type(e).__name__)
-            except ClientPayloadError as e:
-                raise ProfitError(ErrorCode.P0009, aiohttp_error=type(e).__name__)
-            except InvalidURL as e:
-                raise ProfitError(ErrorCode.P0010, aiohttp_error=type(e).__name__)
-            except ClientError as e:
-                raise ProfitError(ErrorCode.P0006, aiohttp_error=type(e).__name__)
-            except Exception as e:  # TODO: maybe do specific catching on deserialization
-                raise ProfitError(ErrorCode.P0000, aiohttp_error=type(e).__name__, decode_error=True)
-
-    except (ContentTypeError, ClientResponseError) as e:
-        raise ProfitError(ErrorCode.P0009, profit_msg=e.message, profit_status=e.status, aiohttp_error=type(e).__name__)
-    except WSServerHandshakeError as e:
-        raise ProfitError(ErrorCode.P0011, profit_msg=e.message, profit_status=e.status, aiohttp_error=type(e).__name__)
-    except ClientHttpProxyError as e:
-        raise ProfitError(ErrorCode.P0007, profit_msg=e.message, profit_status=e.status, aiohttp_error=type(e).__name__)
-    except ClientConnectorCertificateError as e:
-        raise ProfitError(ErrorCode.P0003, aiohttp_error=type(e).__name__)
-    except ClientConnectorSSLError as e:
-        raise ProfitError(ErrorCode.P0005, aiohttp_error=type(e).__name__)
-    except (ClientSSLError, ClientProxyConnectionError, ClientConnectorError) as e:
-        raise ProfitError(ErrorCode.P0004, aiohttp_error=type(e).__name__)
-    except (ServerDisconnectedError, ServerTimeoutError, ServerFingerprintMismatch, ServerConnectionError) as e:
-        raise ProfitError(ErrorCode.P0011, aiohttp_error=type(e).__name__)
-    except ClientOSError as e:
-        raise ProfitError(ErrorCode.P0008, aiohttp_error=type(e).__name__)
-    except ClientConnectionError as e:
-        raise ProfitError(ErrorCode.P0002, aiohttp_error=type(e).__name__)
-    except ClientPayloadError as e:
-        raise ProfitError(ErrorCode.P0009, aiohttp_error=type(e).__name__)
-    except InvalidURL as e:
-        raise ProfitError(ErrorCode.P0010, aiohttp_error=type(e).__name__)
-    except ClientError as e:
-        raise ProfitError(ErrorCode.P0006, aiohttp_error=type(e).__name__)
+    body = json.dumps(data)
+    attempt = 0
+    while True:
+        try:
+            async with guarded_request(method, url):
+                return await _send(method, url, headers, params, body, **kwargs)
+        except Exception as e:
+            if not RETRY_POLICY.should_retry(method, attempt, e):
+                raise _profit_error(e)
+            delay = RETRY_POLICY.delay(attempt, e)
+            logger.warning(f"{method} {url} failed ({type(e).__name__}), retry {attempt + 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
 
 
 async def get_profit_version(endpoint: str, environment_token: str):
@@ -135,12 +143,16 @@ async def get_profit_version(endpoint: str, environment_token: str):
 
 async def get_meta_info(endpoint: str, environment_token: str):
     url = f"{endpoint}/ProfitRestServices/metainfo"
-    return await profit_request("GET", url, environment_token)
+    return await METAINFO_CACHE.get(
+        cache_key(endpoint, environment_token, "metainfo"), partial(profit_request, "GET", url, environment_token)
+    )
 
 
 async def get_connector_metainfo(endpoint: str, environment_token: str, connector: str):
     url = f"{endpoint}/ProfitRestServices/metainfo/get/{connector}"
-    return await profit_request("GET", url, environment_token)
+    return await METAINFO_CACHE.get(
+        cache_key(endpoint, environment_token, "get", connector), partial(profit_request, "GET", url, environment_token)
+    )
 
 
 async def get_connector_data(endpoint: str, environment_token: str, connector: str, params: dict = None):
@@ -148,7 +160,73 @@ async def get_connector_data(endpoint: str, environment_token: str, connector: s
     return await profit_request("GET", url, environment_token, params=params)
 
 
+async def _get_connector_page(endpoint: str, environment_token: str, connector: str, skip: int, take: int) -> list:
+    response = await get_connector_data(endpoint, environment_token, connector, {"skip": skip, "take": take})
+    try:
+        return response["rows"]
+    except KeyError:
+        logger.info(connector)
+        raise ProfitError(error_code=ErrorCode.P0013, msg_args=(connector,))
+
+
+async def get_connector_rows(endpoint: str, environment_token: str, connector: str, page_size: int = PAGE_SIZE,
+                             max_rows: int = MAX_ROWS) -> RowStore:
+    """**Fetches all rows of a GetConnector (up to `max_rows`), in pages that are fetched in parallel.**
+
+    The first page is fetched alone, most GetConnectors fit in it. After a full page up to `PAGE_CONCURRENCY` pages
+    are in flight, never more than the current limit of the environment. The first page that comes back short is the
+    last one, no pages after it get requested anymore. The pages are added to the store in order, as soon as the pages
+    before them are in.
+    """
+    environment_limiter = get_limiter(environment_of(endpoint))
+    rows = RowStore()
+    pages: Dict[int, list] = {}
+    tasks: Dict[asyncio.Task, int] = {}
+    next_page = stored_pages = 0
+    fetch_rows = max_rows + 1  # One row more tells whether the GetConnector has more rows than the maximum.
+    last_page = math.ceil(fetch_rows / page_size) - 1
+    try:
+        while stored_pages <= last_page:
+            window = min(PAGE_CONCURRENCY, environment_limiter.limit) if stored_pages else 1
+            while len(tasks) < window and next_page <= last_page:
+                skip = next_page * page_size
+                task = asyncio.create_task(_get_connector_page(
+                    endpoint, environment_token, connector, skip, min(page_size, fetch_rows - skip)))
+                tasks[task] = next_page
+                next_page += 1
+
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                page = tasks.pop(task)
+                pages[page] = task.result()
+                if len(pages[page]) < page_size and page < last_page:
+                    last_page = page
+            for task, page in list(tasks.items()):
+                if page > last_page:
+                    task.cancel()
+                    del tasks[task]
+            while stored_pages in pages and stored_pages <= last_page:
+                rows.extend(pages.pop(stored_pages))
+                stored_pages += 1
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    if len(rows) > max_rows:
+        rows.truncate(max_rows)
+        logger.warning(f"GetConnector {connector} reached the maximum of {max_rows} rows, later rows are left out")
+    return rows
+
+
 async def update_connector_metainfo(endpoint: str, environment_token: str, connector: str):
+    """The flattened metainfo of an UpdateConnector, cached in its flattened form."""
+    return await METAINFO_CACHE.get(
+        cache_key(endpoint, environment_token, "update", connector),
+        partial(_update_connector_metainfo, endpoint, environment_token, connector),
+    )
+
+
+async def _update_connector_metainfo(endpoint: str, environment_token: str, connector: str):
     url = f"{endpoint}/ProfitRestServices/metainfo/update/{connector}"
     profit_metainfo = await profit_request("GET", url, environment_token)
     metainfo = {
@@ -161,32 +239,49 @@ async def update_connector_metainfo(endpoint: str, environment_token: str, conne
     return metainfo
 
 
+async def _group_request(request: Awaitable[Any]) -> Any:
+    """**The response of one group of an export, a group whose request failed gets its error as its response.**
+
+    The error looks like the error responses of Profit (`errorNumber`), so it counts as a failed group and the groups
+    that did get through are still reported.
+    """
+    try:
+        return await request
+    except ProfitError as e:
+        logger.warning(f"Group failed: {e}")
+        return {
+            "errorNumber": e.error_code.name,
+            "externalMessage": e.error_msg,
+            **{key: str(value) for key, value in e.kwargs.items()},
+        }
+
+
 async def update_connector_post(endpoint: str, environment_token: str, connector: str, send_method: str,
                                 data: list) -> dict or str:
     start_time = time.monotonic()
 
     url = f"{endpoint}/ProfitRestServices/connectors/{connector}"
     tasks = []
-    metainfo = await update_connector_metainfo(endpoint, environment_token, connector)
+    fields = fields_by_connector(await update_connector_metainfo(endpoint, environment_token, connector))
 
     if send_method == "POST":
         for generated_dict in data:
-            new_dict = set_primary_keys_right_dict(metainfo, generated_dict, True)
-            task = asyncio.create_task(profit_request("POST", url, environment_token, data=new_dict))
+            new_dict = set_primary_keys_right_dict(fields, generated_dict, True)
+            task = asyncio.create_task(_group_request(profit_request("POST", url, environment_token, data=new_dict)))
             tasks.append(task)
         profit_responses = await asyncio.gather(*tasks)
     elif send_method == "PUT":
         for generated_dict in data:
-            new_dict = set_primary_keys_right_dict(metainfo, generated_dict, True)
-            task = asyncio.create_task(profit_request("PUT", url, environment_token, data=new_dict))
+            new_dict = set_primary_keys_right_dict(fields, generated_dict, True)
+            task = asyncio.create_task(_group_request(profit_request("PUT", url, environment_token, data=new_dict)))
             tasks.append(task)
         profit_responses = await asyncio.gather(*tasks)
 
     elif send_method == "DELETE":
         for generated_dict in data:
-            new_dict = set_primary_keys_right_dict(metainfo, generated_dict, True)
-            task = asyncio.create_task(
-                update_connector_delete(endpoint, environment_token, connector, send_method, new_dict))
+            new_dict = set_primary_keys_right_dict(fields, generated_dict, True)
+            task = asyncio.create_task(_group_request(
+                update_connector_delete(endpoint, environment_token, connector, send_method, new_dict)))
             tasks.append(task)
         profit_responses = await asyncio.gather(*tasks)
     else:
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Hashable, List, Optional
+
+from yarl import URL
+
+# The number of requests one Profit environment handles at the same time, over all users of this process. Profit
+# blocks at >= 70 open connections (or less?).
+ENVIRONMENT_LIMIT = int(os.getenv("PROFIT_ENVIRONMENT_LIMIT", default=30))
+# Limits of specific environments, as JSON: {"https://12345.rest.afas.online": 10}.
+ENVIRONMENT_LIMITS: Dict[str, int] = json.loads(os.getenv("PROFIT_ENVIRONMENT_LIMITS", default="{}"))
+
+# The flow a request to Profit belongs to, every request to the API is one. Waiting requests of different flows take
+# turns, so one large export doesn't make every other user wait until it is done.
+current_flow: ContextVar[Optional[Hashable]] = ContextVar("current_flow", default=None)
+
+
+class WaitMetrics:
+    """The time requests to one environment waited for their turn."""
+
+    def __init__(self):
+        self.requests = 0
+        self.waited_requests = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float) -> None:
+        self.requests += 1
+        if wait > 0:
+            self.waited_requests += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "waited_requests": self.waited_requests,
+            "average_wait": round(self.total_wait / self.requests, 4) if self.requests else 0.0,
+            "max_wait": round(self.max_wait, 4),
+        }
+
+
+class EnvironmentLimiter:
+    """**Bounds the number of requests in flight to one Profit environment.**
+
+    A request that finds no free place waits in the queue of its flow. A place that comes free goes to the first
+    request of the next flow (round robin), and within a flow the requests go in the order they came in.
+
+    `max_limit` is the configured limit, `limit` the one that currently holds (see `AIMDController`).
+    """
+
+    def __init__(self, environment: str, limit: int):
+        self.environment = environment
+        self.max_limit = limit
+        self._limit = limit
+        self._in_flight = 0
+        self._queues: Dict[Hashable, Deque[asyncio.Future]] = {}
+        self.metrics = WaitMetrics()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @limit.setter
+    def limit(self, limit: int) -> None:
+        self._limit = min(max(1, limit), self.max_limit)
+        self._wake()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        return sum(not future.done() for queue in self._queues.values() for future in queue)
+
+    async def acquire(self, flow: Hashable = None) -> None:
+        start = time.monotonic()
+        if self._in_flight < self._limit and not self._queues:
+            self._in_flight += 1
+            self.metrics.record(0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(flow, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():  # Got its place while being cancelled.
+                self.release()
+            raise
+        self.metrics.record(time.monotonic() - start)
+
+    def release(self) -> None:
+        self._in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._in_flight < self._limit and self._queues:
+            flow, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            del self._queues[flow]
+            if queue:  # The flow goes to the back of the line.
+                self._queues[flow] = queue
+            if future.cancelled():
+                continue
+            self._in_flight += 1
+            future.set_result(None)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "environment": self.environment,
+            "limit": self._limit,
+            "max_limit": self.max_limit,
+            "in_flight": self._in_flight,
+            "queued": self.queued,
+            **self.metrics.as_dict(),
+        }
+
+
+_limiters: Dict[str, EnvironmentLimiter] = {}
+
+
+def environment_of(url: str) -> str:
+    """The Profit environment of a url, its scheme and host (the `profit_endpoint` of a template)."""
+    return str(URL(url).origin())
+
+
+def get_limiter(environment: str) -> EnvironmentLimiter:
+    limiter = _limiters.get(environment)
+    if limiter is None:
+        limit = ENVIRONMENT_LIMITS.get(environment, ENVIRONMENT_LIMIT)
+        limiter = _limiters[environment] = EnvironmentLimiter(environment, limit)
+    return limiter
+
+
+def set_environment_limit(environment: str, limit: int) -> EnvironmentLimiter:
+    limiter = get_limiter(environment_of(environment))
+    limiter.max_limit = limit
+    limiter.limit = limit
+    return limiter
+
+
+@asynccontextmanager
+async def environment_slot(url: str):
+    """Holds a place of the environment of `url` for the duration of a request."""
+    limiter = get_limiter(environment_of(url))
+    await limiter.acquire(current_flow.get())
+    try:
+        yield limiter
+    finally:
+        limiter.release()
+
+
+def limiters() -> List[EnvironmentLimiter]:
+    return list(_limiters.values())
@@ -0,0 +1,282 @@
+import asyncio
+import math
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from aiohttp.client_exceptions import (
+    ClientConnectorCertificateError,
+    ClientConnectorError,
+    ClientOSError,
+    ClientPayloadError,
+    ClientSSLError,
+    ServerDisconnectedError,
+)
+from loguru import logger
+from yarl import URL
+
+from errors import ErrorCode, ProfitError
+from profit.limiter import EnvironmentLimiter, environment_of, environment_slot, get_limiter, limiters
+
+# The number of times a request gets sent at most, the first time included.
+RETRY_ATTEMPTS = int(os.getenv("PROFIT_RETRY_ATTEMPTS", default=4))
+# Seconds of the first backoff, it doubles every retry up to the maximum. The real wait is a random part of it.
+RETRY_BASE_DELAY = float(os.getenv("PROFIT_RETRY_BASE_DELAY", default=0.5))
+RETRY_MAX_DELAY = float(os.getenv("PROFIT_RETRY_MAX_DELAY", default=10))
+# Statuses of a Profit that is too busy. A 500 is not one of them, Profit answers invalid data with it.
+RETRY_STATUSES = (429, 502, 503, 504)
+# Methods that do the same when they are sent twice.
+IDEMPOTENT_METHODS = ("GET", "PUT", "DELETE")
+
+# The average latency that counts as slow, in times the normal latency of the kind of request.
+LATENCY_TOLERANCE = 3.0
+# Weight of the last request in the average latency, and in the normal latency, which follows a slower environment
+# slowly.
+LATENCY_SMOOTHING = 0.2
+BASELINE_DRIFT = 0.01
+DECREASE_FACTOR = 0.5
+# Seconds between two decreases at least, the requests that were already in flight are just as slow.
+DECREASE_COOLDOWN = 1.0
+
+# Transient failures in a row after which the environment gets no requests for `BREAKER_RESET_TIMEOUT` seconds.
+BREAKER_FAILURES = int(os.getenv("PROFIT_BREAKER_FAILURES", default=10))
+BREAKER_RESET_TIMEOUT = float(os.getenv("PROFIT_BREAKER_RESET_TIMEOUT", default=30))
+
+
+class ProfitUnavailable(Exception):
+    """Profit answered with one of the `RETRY_STATUSES`."""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[str] = None):
+        super().__init__(status, message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+class RetryPolicy:
+    """**Decides which failed requests get sent again, and when.**
+
+    Requests with an idempotent method are retried on every transient failure. A POST is only retried when it can't
+    have reached Profit: when no connection could be made, or when Profit refused it with a 429. The backoff is
+    exponential with full jitter, so the retries of a large export don't hit Profit at the same moment.
+    """
+
+    def __init__(self, attempts: int = RETRY_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @staticmethod
+    def is_connect_error(error: Exception) -> bool:
+        return isinstance(error, ClientConnectorError) and not isinstance(
+            error, (ClientConnectorCertificateError, ClientSSLError))
+
+    @staticmethod
+    def is_transient(error: Exception) -> bool:
+        if isinstance(error, (ClientConnectorCertificateError, ClientSSLError)):
+            return False
+        return isinstance(error, (ProfitUnavailable, asyncio.TimeoutError, ServerDisconnectedError, ClientOSError,
+                                  ClientPayloadError))
+
+    def should_retry(self, method: str, attempt: int, error: Exception) -> bool:
+        if attempt + 1 >= self.attempts:
+            return False
+        if method in IDEMPOTENT_METHODS:
+            return self.is_transient(error)
+        return self.is_connect_error(error) or (isinstance(error, ProfitUnavailable) and error.status == 429)
+
+    def delay(self, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self.max_delay))
+        return delay
+
+
+def request_kind(method: str, url: str) -> str:
+    """**The method and the first three parts of the path, like `GET /ProfitRestServices/metainfo/get`.**
+
+    Requests of one kind take about as long, a GetConnector page takes longer than the metainfo of its connector.
+    """
+    return f"{method} {'/'.join(URL(url).path.split('/')[:4])}"
+
+
+class Latency:
+    """The average latency of one kind of request, and its normal latency."""
+    __slots__ = ("latency", "baseline")
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.baseline = latency
+
+    def record(self, latency: float) -> bool:
+        """Adds the latency of a request, returns whether the average latency is slow."""
+        self.latency += (latency - self.latency) * LATENCY_SMOOTHING
+        self.baseline += (self.latency - self.baseline) * BASELINE_DRIFT
+        return self.latency > self.baseline * LATENCY_TOLERANCE
+
+    def as_dict(self) -> Dict[str, float]:
+        return {"latency": round(self.latency, 4), "normal_latency": round(self.baseline, 4)}
+
+
+class AIMDController:
+    """**Adapts the limit of an environment to how fast Profit answers.**
+
+    A transient failure, or an average latency above `LATENCY_TOLERANCE` times the normal latency of its kind of
+    request, halves the limit (multiplicative decrease). Once the limit requests in a row were answered in time, it
+    grows by one again (additive increase), up to the configured maximum. The latencies are kept per kind of request
+    (`request_kind`), so fast metainfo requests don't make a large GetConnector look slow.
+    """
+
+    def __init__(self, limiter: EnvironmentLimiter):
+        self._limiter = limiter
+        self._latencies: Dict[str, Latency] = {}
+        self._successes = 0
+        self._last_decrease = 0.0
+
+    def record(self, kind: str, latency: float, failed: bool) -> None:
+        slow = False
+        if not failed:
+            kind_latency = self._latencies.get(kind)
+            if kind_latency is None:
+                self._latencies[kind] = Latency(latency)
+            else:
+                slow = kind_latency.record(latency)
+        if failed or slow:
+            self._decrease(latency)
+        else:
+            self._increase()
+
+    def _decrease(self, latency: float) -> None:
+        self._successes = 0
+        now = time.monotonic()
+        if now - self._last_decrease < max(DECREASE_COOLDOWN, latency):
+            return
+        self._last_decrease = now
+        limit = max(1, int(self._limiter.limit * DECREASE_FACTOR))
+        if limit < self._limiter.limit:
+            logger.warning(f"Profit {self._limiter.environment} slows down, limit {self._limiter.limit} -> {limit}")
+            self._limiter.limit = limit
+
+    def _increase(self) -> None:
+        self._successes += 1
+        if self._successes >= self._limiter.limit and self._limiter.limit < self._limiter.max_limit:
+            self._successes = 0
+            self._limiter.limit += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"latencies": {kind: latency.as_dict() for kind, latency in self._latencies.items()}}
+
+
+class CircuitBreaker:
+    """**Stops sending requests to an environment that keeps failing.**
+
+    After `BREAKER_FAILURES` transient failures in a row the breaker opens: requests fail at once for
+    `BREAKER_RESET_TIMEOUT` seconds. Then one request gets through as a trial, which closes the breaker again when it
+    succeeds and opens it for another period when it fails.
+    """
+
+    def __init__(self, environment: str):
+        self.environment = environment
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._trial or time.monotonic() - self._opened_at >= BREAKER_RESET_TIMEOUT:
+            return "half_open"
+        return "open"
+
+    def check(self) -> None:
+        """Fails while the breaker is open, or lets the request through as the trial."""
+        if self._opened_at is None:
+            return
+        remaining = self._opened_at + BREAKER_RESET_TIMEOUT - time.monotonic()
+        if remaining > 0 or self._trial:
+            raise ProfitError(ErrorCode.P0014, (self.environment, max(1, math.ceil(remaining))), 503)
+        self._trial = True
+
+    def record(self, failed: bool) -> None:
+        if not failed:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+            return
+        self._failures += 1
+        if self._trial or self._failures >= BREAKER_FAILURES:
+            if self._opened_at is None:
+                logger.warning(f"Profit {self.environment} failed {self._failures} times in a row, breaker opened")
+            self._opened_at = time.monotonic()
+            self._trial = False
+
+    def abandon(self) -> None:
+        """The trial got cancelled, the next request may try again."""
+        self._trial = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"breaker": self.state, "failures_in_a_row": self._failures}
+
+
+RETRY_POLICY = RetryPolicy()
+_controllers: Dict[str, AIMDController] = {}
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_controller(environment: str) -> AIMDController:
+    controller = _controllers.get(environment)
+    if controller is None:
+        controller = _controllers[environment] = AIMDController(get_limiter(environment))
+    return controller
+
+
+def get_breaker(environment: str) -> CircuitBreaker:
+    breaker = _breakers.get(environment)
+    if breaker is None:
+        breaker = _breakers[environment] = CircuitBreaker(environment)
+    return breaker
+
+
+@asynccontextmanager
+async def guarded_request(method: str, url: str):
+    """**Sends one attempt of a request through the breaker and the limiter of its environment.**
+
+    How the attempt went (its latency, or whether it failed transiently) feeds the controller and the breaker.
+    """
+    environment = environment_of(url)
+    breaker = get_breaker(environment)
+    controller = get_controller(environment)
+    kind = request_kind(method, url)
+    breaker.check()
+    async with environment_slot(url):
+        start = time.monotonic()
+        try:
+            yield
+        except asyncio.CancelledError:
+            breaker.abandon()
+            raise
+        except Exception as e:
+            failed = RETRY_POLICY.is_transient(e)
+            controller.record(kind, time.monotonic() - start, failed)
+            breaker.record(failed)
+            raise
+        controller.record(kind, time.monotonic() - start, False)
+        breaker.record(False)
+
+
+def environment_status() -> list:
+    """The limit, load, wait times, latency and breaker of every environment this process sent requests to."""
+    status = []
+    for limiter in limiters():
+        environment = limiter.environment
+        status.append({
+            **limiter.as_dict(),
+            **get_controller(environment).as_dict(),
+            **get_breaker(environment).as_dict(),
+        })
+    return status
@@ -0,0 +1,83 @@
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+class _Missing:
+    """The value of a field a row doesn't have, still the same object after pickling it for a shard."""
+
+    def __reduce__(self) -> str:
+        return "_MISSING"
+
+
+_MISSING = _Missing()
+
+
+class Row(Mapping):
+    """A read-only row of a `RowStore`, which behaves like the dict Profit sent."""
+    __slots__ = ("_fields", "_values")
+
+    def __init__(self, fields: Dict[str, int], values: Tuple[Any, ...]):
+        self._fields = fields
+        self._values = values
+
+    def __getitem__(self, field: str) -> Any:
+        try:
+            value = self._values[self._fields[field]]
+        except IndexError:
+            raise KeyError(field)
+        if value is _MISSING:
+            raise KeyError(field)
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        return (field for field in self._fields if self.get(field, _MISSING) is not _MISSING)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class RowStore(Sequence):
+    """**The rows of a GetConnector, stored as tuples of values with one shared field index.**
+
+    The rows of a GetConnector all have the same fields, so a dict per row mostly stores the same keys again. A row
+    with a field the store doesn't know yet adds it to the index; the rows without it raise a `KeyError` for it, like
+    their dict would.
+    """
+
+    def __init__(self, rows: Iterable[dict] = ()):
+        self._fields: Dict[str, int] = {}
+        self._order: Tuple[str, ...] = ()
+        self._rows: List[Tuple[Any, ...]] = []
+        self.extend(rows)
+
+    def _values(self, row: dict) -> Tuple[Any, ...]:
+        if tuple(row) == self._order:
+            return tuple(row.values())
+        for field in row:
+            self._fields.setdefault(field, len(self._fields))
+        self._order = tuple(self._fields)
+        values = [_MISSING] * len(self._fields)
+        for field, value in row.items():
+            values[self._fields[field]] = value
+        return tuple(values)
+
+    def extend(self, rows: Iterable[dict]) -> None:
+        self._rows.extend(self._values(row) for row in rows)
+
+    def truncate(self, length: int) -> None:
+        del self._rows[length:]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Row(self._fields, values) for values in self._rows[index]]
+        return Row(self._fields, self._rows[index])
+
+    def __iter__(self) -> Iterator[Row]:
+        fields = self._fields
+        return (Row(fields, values) for values in self._rows)
@@ -0,0 +1,57 @@
+import os
+from typing import Optional
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from loguru import logger
+
+# Profit blocks at >= 70 open connections (or less?), the limits are per process.
+TCP_LIMIT = int(os.getenv("PROFIT_TCP_LIMIT", default=35))
+TCP_LIMIT_PER_HOST = int(os.getenv("PROFIT_TCP_LIMIT_PER_HOST", default=35))
+# Seconds an idle connection stays open for the next request, saves the TCP and TLS handshakes.
+KEEPALIVE_TIMEOUT = float(os.getenv("PROFIT_KEEPALIVE_TIMEOUT", default=30))
+# Seconds a resolved Profit host is kept.
+DNS_CACHE_TTL = int(os.getenv("PROFIT_DNS_CACHE_TTL", default=300))
+# Seconds a request to Profit (including the wait for a free connection) may take, 0 waits forever.
+REQUEST_TIMEOUT = float(os.getenv("PROFIT_REQUEST_TIMEOUT", default=0))
+
+_session: Optional[ClientSession] = None
+
+
+def _create_session() -> ClientSession:
+    connector = TCPConnector(
+        ssl=False,
+        limit=TCP_LIMIT,
+        limit_per_host=TCP_LIMIT_PER_HOST,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        use_dns_cache=True,
+        ttl_dns_cache=DNS_CACHE_TTL,
+    )
+    return ClientSession(connector=connector, timeout=ClientTimeout(total=REQUEST_TIMEOUT or None))
+
+
+async def open_session() -> ClientSession:
+    """Opens the session of the process, in the startup of the server."""
+    global _session
+    if _session is None or _session.closed:
+        _session = _create_session()
+        logger.info(f"Opened the Profit session (limit {TCP_LIMIT}, per host {TCP_LIMIT_PER_HOST})")
+    return _session
+
+
+async def close_session() -> None:
+    """Closes the session of the process and its connections, in the shutdown of the server."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def get_session() -> ClientSession:
+    """**The session every request to Profit goes through.**
+
+    The connections in its pool stay open between requests, so the limits hold for the whole process. Outside of the
+    server (scripts) the session gets opened on the first request.
+    """
+    if _session is None or _session.closed:
+        return await open_session()
+    return _session
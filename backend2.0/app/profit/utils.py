@@ -1,9 +1,13 @@
 import base64
-from typing import Dict
-from datetime import datetime
+from typing import Dict, List
 
 from loguru import logger
 
+from dates import date_normaliser, profit_date
+
+# The metainfo of the fields by connector name and field id. See `fields_by_connector`.
+FieldIndex = Dict[str, Dict[str, List[dict]]]
+
 
 def get_token_headers(environment_token: str) -> Dict[str, str]:
     token_bytes = environment_token.encode("ascii")
@@ -63,54 +67,56 @@ def get_keys(url_elements: list, data):
         return final_key
 
 
-def set_primary_keys_right_dict(metainfo, data, set_date):
-    update_connector = next(iter(data))
-    for key, value in data[update_connector]["Element"]["Fields"].items():
+def fields_by_connector(metainfo: dict) -> FieldIndex:
+    """The metainfo of the fields by connector name and field id, built once per request for all of its rows."""
+    index = {}
+    for connector in metainfo["connectors"]:
+        for field in connector["fields"]:
+            index.setdefault(connector["name"], {}).setdefault(field["fieldId"], []).append(field)
+    return index
+
+
+def set_fields_right(fields_metainfo: Dict[str, List[dict]], element: dict, set_date: bool):
+    """**Adds the `@` keys of the primary key fields of an element, and converts its dates for Profit.**
+
+    The dates get converted per field with the parser of its data type, a field without metainfo tries every value.
+    """
+    fields = element["Fields"]
+    for key, value in fields.items():
+        field_metainfo = fields_metainfo.get(key, ())
         if set_date:
-            try:
-                data[update_connector]["Element"]["Fields"][key] = datetime.strftime(datetime.fromisoformat(value[:-1]).astimezone(), "%Y-%m-%d")
-            except (ValueError, TypeError):
-                value = value
-        for connector in metainfo["connectors"]:
-            if connector["name"] == update_connector:
-                for field in connector["fields"]:
-                    if field["fieldId"] == key:
-                        if field["primaryKey"]:
-                            new_field_id = "@" + key
-                            data[update_connector]["Element"][new_field_id] = value
+            data_type = field_metainfo[0].get("dataType") if field_metainfo else None
+            fields[key] = date_normaliser(data_type, profit_date)(value)
+        if any(field["primaryKey"] for field in field_metainfo):
+            element["@" + key] = value
+
+
+def set_primary_keys_right_dict(fields: FieldIndex, data, set_date):
+    update_connector = next(iter(data))
+    set_fields_right(fields.get(update_connector, {}), data[update_connector]["Element"],
+                     set_date)
     need_objects = data[update_connector]["Element"]["Objects"]
     if type(need_objects) == dict:
-        set_primary_keys_right_dict(metainfo, need_objects, set_date)
+        set_primary_keys_right_dict(fields, need_objects, set_date)
     elif type(need_objects) == list and need_objects != []:
-        set_primary_key_right_list(metainfo, need_objects, set_date)
+        set_primary_key_right_list(fields, need_objects, set_date)
     else:
         return data
     return data
 
 
-def set_primary_key_right_list(metainfo, data, set_date):
+def set_primary_key_right_list(fields: FieldIndex, data, set_date):
     for dictionary in data:
         first_key = next(iter(dictionary))
+        fields_metainfo = fields.get(first_key, {})
         for item in dictionary[first_key]["Element"]:
-            for key, value in item["Fields"].items():
-                if set_date:
-                    try:
-                        item["Fields"][key] = datetime.strftime(datetime.fromisoformat(value[:-1]).astimezone(), "%Y-%m-%d")
-                    except (ValueError, TypeError):
-                        value = value
-                for connector in metainfo["connectors"]:
-                    if connector["name"] == first_key:
-                        for field in connector["fields"]:
-                            if field["fieldId"] == key:
-                                if field["primaryKey"]:
-                                    new_field_id = "@" + key
-                                    item[new_field_id] = value
+            set_fields_right(fields_metainfo, item, set_date)
             try:
                 need_objects = item["Element"]["Objects"]
                 if type(need_objects) == dict:
-                    set_primary_keys_right_dict(metainfo, need_objects, set_date)
+                    set_primary_keys_right_dict(fields, need_objects, set_date)
                 elif type(need_objects) == list and need_objects != []:
-                    set_primary_key_right_list(metainfo, need_objects, set_date)
+                    set_primary_key_right_list(fields, need_objects, set_date)
                 else:
                     pass
             except KeyError:
@@ -1,6 +1,8 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Body
+from pydantic import PositiveInt
 
-from profit import connections
+from profit import connections, limiter, resilience
+from profit.cache import METAINFO_CACHE
 
 router = APIRouter()
 
@@ -8,3 +10,27 @@ router = APIRouter()
 @router.post("/check_profit_version")
 async def check_profit_version(data: dict):
     return await connections.get_profit_version(data["profit_endpoint"], data["token"])
+
+
+@router.get("/profit_environments")
+async def get_profit_environments():
+    """**The Profit environments this process sends requests to, with their limit, load, wait times and breaker.**"""
+    return resilience.environment_status()
+
+
+@router.put("/profit_environments/limit")
+async def set_profit_environment_limit(profit_endpoint: str = Body(...), limit: PositiveInt = Body(...)):
+    """**Sets the maximum number of requests in flight to a Profit environment.**"""
+    return limiter.set_environment_limit(profit_endpoint, limit).as_dict()
+
+
+@router.get("/metainfo_cache")
+async def get_metainfo_cache():
+    """**The size and hit rate of the cache of Profit metainfo.**"""
+    return METAINFO_CACHE.as_dict()
+
+
+@router.delete("/metainfo_cache")
+async def invalidate_metainfo_cache():
+    """**Drops the cached metainfo of every Profit environment.**"""
+    return {"invalidated": METAINFO_CACHE.invalidate()}
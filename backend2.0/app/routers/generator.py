@@ -1,7 +1,12 @@
 import time
+from typing import Iterator
 
+import orjson
 from database.database import DatabaseSession, db_connection
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from loguru import logger
 from generator.schemas.input import ConfigurationDashboard
 from generator.core import Engine
 from generator.functions.methods import Functions
@@ -9,10 +14,15 @@ from generator.functions.utils import compose_functions_metainfo
 from profit.utils import set_primary_keys_right_dict
 from generator.profit import Fuel
 from routers.database import get_methods
-from errors import GeneratorError, ErrorCode
+from errors import GeneratorError, ErrorCode, RocketError
+from exception_handlers import rocket_exception_handler
 
 router = APIRouter()
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+EMPTY_ROW_MESSAGE = "Het aantal rijen is minder, omdat er op sommige plekken het woord ##DELETE is gebruikt " \
+                    "of gebruik gemaakt is van de functie Bronwaarde met vaste waarde."
+
 
 @router.get("/functions_metainfo")
 async def get_functions_info(methods=Depends(get_methods)):
@@ -25,6 +35,7 @@ async def generate(
         process_id: int,
         configurations: ConfigurationDashboard,
         db: DatabaseSession = Depends(db_connection),
+        accept: str = Header(""),
 ):
     if configurations.process_settings.send_method == "":
         raise GeneratorError(ErrorCode.U0020)
@@ -36,16 +47,21 @@ async def generate(
 
     generation_start_time = time.monotonic()
     engine = Engine(fuel)
-    engine.run()
+    if NDJSON_MEDIA_TYPE in accept:
+        await run_in_threadpool(engine.prepare)  # Errors in the configurations still get a normal error response.
+        return StreamingResponse(
+            stream_generated_rows(engine, fuel, profit_completed_time, generation_start_time),
+            media_type=NDJSON_MEDIA_TYPE,
+        )
+    await run_in_threadpool(engine.run)  # Keeps the event loop free, a large run is generated in shards.
 
     result = engine.generated_data
     result_pk = []
     empty_row_message = ""
     if result["row_removed"]:
-        empty_row_message = "Het aantal rijen is minder, omdat er op sommige plekken het woord ##DELETE is gebruikt " \
-                            "of gebruik gemaakt is van de functie Bronwaarde met vaste waarde."
+        empty_row_message = EMPTY_ROW_MESSAGE
     for row in result["generated_data"]:
-        result_pk.append(set_primary_keys_right_dict(fuel.raw_metainfo, row, False))
+        result_pk.append(set_primary_keys_right_dict(fuel.fields_by_connector, row, False))
     generation_complete_time = round((time.monotonic() - generation_start_time) * 1000, 2)
 
     response = {
@@ -54,6 +70,39 @@ async def generate(
         "profit_time_seconds": profit_completed_time,
         "generation_time_milliseconds": generation_complete_time,
         "empty_row": empty_row_message,
-        "rows_pk": result_pk
+        "rows_pk": result_pk,
+        "seed": engine.random_streams.seed,
     }
     return response
+
+
+def stream_generated_rows(engine: Engine, fuel: Fuel, profit_completed_time: float,
+                          generation_start_time: float) -> Iterator[bytes]:
+    """**Streams the generated rows as NDJSON, one line per group and a summary line at the end.**
+
+    The lines get generated while they are sent, `StreamingResponse` runs this generator in a thread. An error during
+    the generation becomes an error line, in the same format as the error responses, before the summary line of the
+    groups that were sent.
+    """
+    groups_amount = 0
+    try:
+        for row in engine.stream():
+            groups_amount += 1
+            yield orjson.dumps(
+                {"row": row, "row_pk": set_primary_keys_right_dict(fuel.fields_by_connector, row, False)}
+            ) + b"\n"
+    except RocketError as e:  # The response has started already, so the error becomes a line.
+        yield rocket_exception_handler(None, e).body + b"\n"
+    except Exception:
+        logger.exception("Generating the NDJSON stream failed")
+        yield rocket_exception_handler(None, GeneratorError(ErrorCode.B0000)).body + b"\n"
+    generation_complete_time = round((time.monotonic() - generation_start_time) * 1000, 2)
+
+    summary = {
+        "group_sizes": groups_amount,
+        "profit_time_seconds": profit_completed_time,
+        "generation_time_milliseconds": generation_complete_time,
+        "empty_row": EMPTY_ROW_MESSAGE if engine.row_removed else "",
+        "seed": engine.random_streams.seed,
+    }
+    yield orjson.dumps({"summary": summary}) + b"\n"
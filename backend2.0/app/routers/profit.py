@@ -3,6 +3,7 @@ from loguru import logger
 from datetime import datetime, timedelta
 
 from profit import connections
+from profit.cache import METAINFO_CACHE
 from pydantic import NonNegativeInt
 from routers.template import get_template
 from routers.entity import get_process_dashboard
@@ -79,3 +80,17 @@ async def update_connector_post(connector: str, data: list, process=Depends(get_
 @router.get("/update_connectors/{connector}/metainfo")
 async def update_connector_meta_info(connector: str, template=Depends(get_template)):
     return await connections.update_connector_metainfo(template.profit_endpoint, template.token, connector)
+
+
+@router.delete("/metainfo_cache")
+async def invalidate_metainfo_cache(template=Depends(get_template)):
+    """**Drops the cached metainfo of the Profit environment of the template, after the App connector changed.**"""
+    invalidated = METAINFO_CACHE.invalidate(template.profit_endpoint, template.token)
+    return {"invalidated": invalidated}
+
+
+@router.delete("/metainfo_cache/{connector}")
+async def invalidate_connector_metainfo_cache(connector: str, template=Depends(get_template)):
+    """**Drops the cached metainfo of one connector of the Profit environment of the template.**"""
+    invalidated = METAINFO_CACHE.invalidate(template.profit_endpoint, template.token, connector)
+    return {"invalidated": invalidated}